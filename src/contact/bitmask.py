@@ -0,0 +1,121 @@
+from functools import reduce
+from operator import add
+
+from django.db import models
+from django.db.models import F, Case, When, Value, Q, Func, IntegerField
+
+FEATURE_FIELDS = (
+    "is_multilingual",
+    "is_response_guaranteed",
+    "is_verifiable",
+    "is_confirmation_issued",
+    "is_mobile_friendly",
+    "is_final_destination",
+    "is_anonymous_allowed",
+)
+# values of `BaseContactPoint.EXTENDED_BOOLEAN_CHOICES`
+FEATURE_STATES = ('yes', 'no', 'dontknow')
+
+REQUIREMENT_FIELDS = (
+    "is_registration_required",
+    "is_photo_required",
+    "is_esign_required",
+    "is_name_required",
+    "is_email_required",
+    "is_pic_required",
+    "is_address_required",
+    "is_phone_required",
+    "is_location_required",
+    "is_other_required",
+)
+REQUIREMENT_STATES = (True, False)
+
+"""
+Every possible value of a feature or requirement gets its own bit, so matching a criterion
+is a single bit test and the number of matched criteria is the popcount of `mask & wanted`
+"""
+MASKS = {
+    'features_mask': (FEATURE_FIELDS, FEATURE_STATES),
+    'requirements_mask': (REQUIREMENT_FIELDS, REQUIREMENT_STATES),
+}
+
+
+def get_bit(fieldname, value):
+    for fields, states in MASKS.values():
+        if fieldname in fields and value in states:
+            return 1 << (fields.index(fieldname) * len(states) + states.index(value))
+    return 0
+
+
+def get_mask_name(fieldname):
+    for mask_name, (fields, states) in MASKS.items():
+        if fieldname in fields:
+            return mask_name
+
+
+def encode(instance):
+    return {
+        mask_name: reduce(lambda mask, name: mask | get_bit(name, getattr(instance, name)), fields, 0)
+        for mask_name, (fields, states) in MASKS.items()
+    }
+
+
+"""
+Wanted bits per mask for {fieldname: value} criteria
+"""
+def encode_criteria(criteria):
+    wanted = {mask_name: 0 for mask_name in MASKS}
+    for fieldname, value in criteria.items():
+        mask_name = get_mask_name(fieldname)
+        if mask_name is not None:
+            wanted[mask_name] |= get_bit(fieldname, value)
+    return wanted
+
+
+"""
+Expressions that compute the masks from the feature and requirement columns, for set-based backfills
+"""
+def mask_expressions():
+    return {
+        mask_name: reduce(add, [
+            Case(*[When(Q(**{name: state}), then=Value(get_bit(name, state))) for state in states],
+                 default=Value(0), output_field=IntegerField())
+            for name in fields
+        ])
+        for mask_name, (fields, states) in MASKS.items()
+    }
+
+
+class BitCount(Func):
+    template = "LENGTH(REPLACE(CAST(%(expressions)s AS BIT(32))::TEXT, '0', ''))"
+
+    def __init__(self, expression, **extra):
+        super().__init__(expression, output_field=IntegerField(), **extra)
+
+
+"""
+Number of wanted bits that are set, i.e. the number of matched criteria
+"""
+def score_expression(wanted):
+    scores = [BitCount(F(mask_name).bitand(bits)) for mask_name, bits in sorted(wanted.items()) if bits]
+    return reduce(add, scores) if scores else 0
+
+
+def filters(wanted):
+    return reduce(lambda q, item: q & Q(**{item[0] + '__hasbits': item[1]}),
+                  [item for item in sorted(wanted.items()) if item[1]], Q())
+
+
+class BitmaskField(models.IntegerField):
+    pass
+
+
+class HasBits(models.Lookup):
+    lookup_name = 'hasbits'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return '(%s & %s) = %s' % (lhs, rhs, rhs), lhs_params + rhs_params + rhs_params
+
+BitmaskField.register_lookup(HasBits)
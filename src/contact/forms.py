@@ -1,6 +1,13 @@
+import json
+from collections import namedtuple
+from hashlib import md5
+
 from django import forms
+from django.core import signing
 from django.db.models import IntegerField, Case, When, Q
+from django.utils.translation import ugettext_lazy as _
 from .apps import setting
+from . import bitmask
 
 ContactPoint = setting("CONTACT_POINT_MODEL")
 Category = setting("CONTACT_CATEGORY_MODEL")
@@ -11,6 +18,53 @@ def make_score_value(filters):
     return Case(When(filters, then=1), default=0, output_field=IntegerField())
 
 
+Cursor = namedtuple('Cursor', ['value', 'pk', 'is_loose_search'])
+
+
+class ResolvedCriteria(object):
+    """
+    Selected categories, keywords and areas of a validated criteria form, materialized once.
+    The choice fields already evaluate their querysets during validation and area families come from the in-memory closure.
+    """
+
+    def __init__(self, categories, keywords, areas):
+        self.categories = list(categories)
+        self.keywords = list(keywords)
+        self.areas = list(areas)
+        self._area_ids = None
+
+    @property
+    def has_taxonomy(self):
+        return bool(self.categories or self.keywords)
+
+    @property
+    def has_specific_area(self):
+        return bool(self.areas) and not self.areas[0].is_root_node()
+
+    @property
+    def area_ids(self):
+        if self._area_ids is None:
+            ids = self._get_area_closure().family(self.areas[0].pk)
+            self._area_ids = ids.union(area.pk for area in self.areas)
+        return self._area_ids
+
+    def area_filter(self, lookup):
+        return self._get_area_closure().family_filter(self.areas[0].pk, lookup) | \
+            Q(**{lookup + '__in': [area.pk for area in self.areas]})
+
+    def _get_area_closure(self):
+        closure = Area.objects.closure()
+        if self.areas[0].pk not in closure:
+            # the area was added after the closure was loaded
+            Area.objects.invalidate_closure()
+            closure = Area.objects.closure()
+        return closure
+
+    @property
+    def term(self):
+        return ' '.join(instance.title for instance in self.categories + self.keywords)
+
+
 class BaseUserCriteriaForm(forms.Form):
     YES = ContactPoint.YES
     NO = ContactPoint.NO
@@ -20,6 +74,9 @@ class BaseUserCriteriaForm(forms.Form):
         (SEARCH_EXPRESSION_SORTING, 'Order by search relevance'),
     )
     SEARCH_RANKING_SORTING = '-watson_rank'
+    CURSOR_SALT = 'contact.forms.cursor'
+    # don't change which points match
+    NON_CRITERIA_FIELDS = ('start', 'limit', 'sorting', 'cursor', 'facets')
 
     exact_match_fields = [
         "is_multilingual",
@@ -41,6 +98,8 @@ class BaseUserCriteriaForm(forms.Form):
 
     start = forms.IntegerField(required=False, min_value=0, initial=0)
     limit = forms.IntegerField(required=False, min_value=1, initial=12)
+    cursor = forms.CharField(required=False)
+    facets = forms.BooleanField(required=False)
     sorting = forms.ChoiceField(required=False, initial=SEARCH_EXPRESSION_SORTING, choices=(SEARCH_SORTING_CHOICES,))
     categories = forms.ModelMultipleChoiceField(Category.objects.children().prefetch_parent(), required=False)
     keywords = forms.ModelMultipleChoiceField(Keyword.objects.all(), required=False)
@@ -66,6 +125,7 @@ class BaseUserCriteriaForm(forms.Form):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.max_score = 0
+        self.criteria = None
 
     # use initial values as defaults if not provided
     def clean(self):
@@ -73,6 +133,11 @@ class BaseUserCriteriaForm(forms.Form):
         for name in self.fields:
             if not self[name].html_name in self.data and self.fields[name].initial is not None:
                 cleaned_data[name] = self.fields[name].initial
+        self.criteria = ResolvedCriteria(
+            cleaned_data.get('categories') or [],
+            cleaned_data.get('keywords') or [],
+            cleaned_data.get('areas') or [],
+        )
         return cleaned_data
 
     def get_instance_html_name(self, instance):
@@ -102,22 +167,86 @@ class BaseUserCriteriaForm(forms.Form):
     def get_limit(self):
         return self.cleaned_data['limit']
 
+    def wants_facets(self):
+        return self.cleaned_data['facets']
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data['cursor']
+        if not cursor:
+            return None
+        try:
+            return signing.loads(cursor, salt=self.CURSOR_SALT)
+        except signing.BadSignature:
+            raise forms.ValidationError(_('Invalid cursor'), code='invalid')
+
+    """
+    Returns the position to continue from, or None when no cursor was given.
+    A cursor is only valid for the sorting it was made for.
+    """
+    def get_cursor(self, sorting):
+        cursor = self.cleaned_data['cursor']
+        if cursor is None:
+            return None
+        keyset = ContactPoint.objects.get_keyset_ordering(sorting)
+        if keyset is None or cursor['sorting'] != list(keyset):
+            raise forms.ValidationError(_('The cursor does not match the sorting'), code='invalid')
+        fieldname = keyset[0]
+        value = cursor['value']
+        if value is not None and fieldname != 'pk':
+            value = ContactPoint._meta.get_field(fieldname).to_python(value)
+        return Cursor(value, cursor['pk'], cursor['is_loose_search'])
+
+    """
+    Returns an opaque cursor for the page that follows `points`,
+    or None when it was the last page or the sorting can't be followed by a cursor.
+    """
+    def make_next_cursor(self, sorting, points, limit, is_loose_search=False):
+        keyset = ContactPoint.objects.get_keyset_ordering(sorting)
+        if keyset is None or len(points) < limit:
+            return None
+        fieldname = keyset[0]
+        last = points[len(points) - 1]
+        value = getattr(last, fieldname)
+        if value is not None and fieldname != 'pk':
+            value = ContactPoint._meta.get_field(fieldname).value_to_string(last)
+        return signing.dumps({
+            'sorting': list(keyset),
+            'value': value,
+            'pk': last.pk,
+            'is_loose_search': is_loose_search,
+        }, salt=self.CURSOR_SALT)
+
+    def has_criteria(self):
+        for name in self.fields:
+            if name not in self.NON_CRITERIA_FIELDS and self[name].html_name in self.data:
+                return True
+        return False
+
+    """
+    Identifies the criteria independently of paging, sorting and parameter order
+    """
+    def get_criteria_hash(self):
+        criteria = []
+        for name in sorted(self.fields):
+            if name in self.NON_CRITERIA_FIELDS or self[name].html_name not in self.data:
+                continue
+            value = self.cleaned_data[name]
+            if isinstance(self.fields[name], forms.ModelMultipleChoiceField):
+                value = sorted(instance.pk for instance in value)
+            criteria.append((name, value))
+        return md5(json.dumps(criteria, default=str).encode('utf-8')).hexdigest()
+
     def keywords_score(self):
         raise NotImplementedError('Must implement')
 
     def get_area_ids(self):
-        first_area = self.cleaned_data['areas'][0]
-        ids = list(first_area.get_family().values_list('pk', flat=True))
-        ids = ids + list(self.cleaned_data['areas'].values_list('pk', flat=True))
-        return set(ids)
+        return self.criteria.area_ids
 
     def has_specific_area(self):
-        area = self.cleaned_data['areas']
-        return area.exists() and not area[0].is_root_node()
+        return self.criteria.has_specific_area
 
     def has_taxonomy(self):
-        data = self.cleaned_data
-        return data['categories'].exists() or data['keywords'].exists()
+        return self.criteria.has_taxonomy
 
     # Kept different from has_taxonomy because `areas` are very likely to be included after user-testing
     @property
@@ -133,20 +262,14 @@ class BaseUserCriteriaForm(forms.Form):
 
     def area_search_filters(self):
         if self.has_specific_area():
-            return Q(operational_area__in=self.get_area_ids())
+            return self.criteria.area_filter('operational_area')
         else:
             return Q()
 
     def get_term(self):
-        data = self.cleaned_data
         if not self.has_taxonomy():
             return
-        term = ''
-        if data['categories'].exists():
-            term += ' '.join(self.cleaned_data['categories'].values_list('title', flat=True))
-        if data['keywords'].exists():
-            term = term + ' ' + ' '.join(self.cleaned_data['keywords'].values_list('title', flat=True))
-        return term.strip()
+        return self.criteria.term.strip()
 
     """
     If we want we can annotate match_<fieldname>_<id> with django.db.models.Value() and know which
@@ -154,18 +277,27 @@ class BaseUserCriteriaForm(forms.Form):
     """
     def to_search_expressions(self):
         filters = self.area_search_filters()
-        score = 0
-        exact_match_filters = Q()
-        is_narrow = self.is_narrow
+        criteria = {}
+        unmasked_filters = []
         for fieldname in self.exact_match_fields:
             if fieldname in self.data:
-                field_filter = Q(**{fieldname: self.cleaned_data[fieldname]})
-                score += make_score_value(field_filter)
+                value = self.cleaned_data[fieldname]
+                if bitmask.get_bit(fieldname, value):
+                    criteria[fieldname] = value
+                else:
+                    # values without a bit, like a blank choice, are matched against the column
+                    unmasked_filters.append(Q(**{fieldname: value}))
                 self.max_score += 1
-                if is_narrow:
-                    exact_match_filters = exact_match_filters & field_filter
 
-        filters = filters & exact_match_filters
+        # one popcount per mask instead of a CASE per field
+        wanted = bitmask.encode_criteria(criteria)
+        score = bitmask.score_expression(wanted)
+        for field_filter in unmasked_filters:
+            score += make_score_value(field_filter)
+        if self.is_narrow:
+            filters = filters & bitmask.filters(wanted)
+            for field_filter in unmasked_filters:
+                filters = filters & field_filter
 
         return score, filters, self.get_term()
 
@@ -1,4 +1,7 @@
-from django.db import models
+from django.db import models, connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.core.exceptions import FieldDoesNotExist
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
@@ -7,6 +10,7 @@ from django.template.defaultfilters import slugify
 from unidecode import unidecode
 from watson import search as watson
 from .apps import setting
+from . import bitmask
 
 class ContactPointManager(models.Manager):
     def apply_criteria(self, score_expression, filters, sorting, term=None, search_backend=None):
@@ -19,11 +23,135 @@ class ContactPointManager(models.Manager):
         if term:
             queryset = watson.filter(queryset, term, backend_name=search_backend)
         queryset, orderby = self._apply_criteria_sorting(queryset, sorting, score_expression)
+        keyset = self.get_keyset_ordering(orderby)
+        if keyset:
+            # ties are broken by pk so pages are stable and can be followed by a cursor
+            fieldname, descending = keyset
+            orderby = ['pk'] if fieldname == 'pk' else [fieldname, 'pk']
+            if descending:
+                orderby = ['-' + name for name in orderby]
         if orderby:
             queryset = queryset.order_by(*orderby)
 
         return queryset
 
+    """
+    Returns the page of up to `limit` matches that follow the `after` (value, pk) key of the last row seen.
+    Unlike `apply_criteria_page` the cost doesn't grow with the depth of the page.
+    Only valid for sortings supported by `get_keyset_ordering`.
+    """
+    def apply_criteria_after(self, score_expression, filters, sorting, after, limit, term=None, search_backend=None):
+        queryset = self.apply_criteria(score_expression, filters, sorting, term, search_backend)
+        fieldname, descending = self.get_keyset_ordering(sorting)
+        if after is not None:
+            queryset = queryset.filter(self._keyset_filter(fieldname, descending, *after))
+        return queryset[:limit]
+
+    """
+    Returns the (field name, descending) pair a keyset cursor can follow for `sorting`,
+    or None when the order depends on several keys or on computed ranks.
+    """
+    def get_keyset_ordering(self, sorting):
+        if not sorting:
+            return 'pk', False
+        if len(sorting) != 1:
+            return None
+        fieldname = sorting[0].lstrip('-')
+        try:
+            field = self.model._meta.get_field(fieldname)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.is_relation:
+            return None
+        return fieldname, sorting[0].startswith('-')
+
+    def _keyset_filter(self, fieldname, descending, value, pk):
+        lookup = 'lt' if descending else 'gt'
+        after_pk = {'pk__' + lookup: pk}
+        if fieldname == 'pk':
+            return Q(**after_pk)
+        # PostgreSQL puts NULLs first in descending and last in ascending order
+        nullable = self.model._meta.get_field(fieldname).null
+        if value is None:
+            after = Q(**dict(after_pk, **{fieldname + '__isnull': True}))
+            if descending:
+                after = after | Q(**{fieldname + '__isnull': False})
+            return after
+        after = Q(**{fieldname + '__' + lookup: value}) | Q(**dict(after_pk, **{fieldname: value}))
+        if nullable and not descending:
+            after = after | Q(**{fieldname + '__isnull': True})
+        return after
+
+    """
+    Returns the total number of matches together with the requested page.
+    The total is computed with a window function alongside the page rows, so
+    a non-empty page costs a single query. An empty page falls back to a cheap
+    emptiness probe and only counts when rows exist before `start`.
+    """
+    def apply_criteria_page(self, score_expression, filters, sorting, start, limit, term=None, search_backend=None):
+        queryset = self.apply_criteria(score_expression, filters, sorting, term, search_backend)
+        page = queryset.annotate(total_matches=RawSQL('COUNT(*) OVER ()', []))[start:(start+limit)]
+        # evaluate while keeping the queryset interface for templates
+        if len(page) > 0:
+            return page[0].total_matches, page
+        if start == 0 or not queryset.exists():
+            return 0, page
+        return queryset.count(), page
+
+    """
+    Counts the matches of the criteria per category, keyword and operational area in a single grouped query.
+    Returns {'categories': {pk: count}, 'keywords': {pk: count}, 'areas': {pk: count}}.
+    `cache_key` identifies the criteria for managers that cache the counts.
+    """
+    def get_facet_counts(self, filters, term=None, search_backend=None, cache_key=None):
+        matches = self.apply_criteria(0, filters, [], term, search_backend).order_by().values('pk')
+        matches_sql, params = matches.query.sql_with_params()
+        opts = self.model._meta
+        keywords = opts.get_field('keywords')
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                WITH matches (id) AS ({matches})
+                SELECT 'categories', point.{category}, COUNT(*)
+                    FROM {table} AS point JOIN matches ON matches.id = point.id
+                    GROUP BY point.{category}
+                UNION ALL
+                SELECT 'areas', point.{area}, COUNT(*)
+                    FROM {table} AS point JOIN matches ON matches.id = point.id
+                    WHERE point.{area} IS NOT NULL
+                    GROUP BY point.{area}
+                UNION ALL
+                SELECT 'keywords', link.{keyword}, COUNT(*)
+                    FROM {through} AS link JOIN matches ON matches.id = link.{point}
+                    GROUP BY link.{keyword}
+            """.format(
+                matches=matches_sql,
+                table=quote(opts.db_table),
+                category=quote(opts.get_field('category').column),
+                area=quote(opts.get_field('operational_area').column),
+                through=quote(keywords.rel.through._meta.db_table),
+                point=quote(keywords.m2m_column_name()),
+                keyword=quote(keywords.m2m_reverse_name()),
+            ), params)
+            rows = cursor.fetchall()
+        facets = {'categories': {}, 'keywords': {}, 'areas': {}}
+        for facet, pk, count in rows:
+            facets[facet][pk] = count
+        return facets
+
+    """
+    Recomputes the feature and requirement masks of all points with one UPDATE,
+    for rows written without `save()`. Returns the number of updated rows.
+    """
+    def update_masks(self):
+        return self.all().update(**bitmask.mask_expressions())
+
+    """
+    Returns (total, page) for criteria-less lists that the manager keeps precomputed, otherwise None
+    """
+    def get_top_page(self, sorting, start, limit):
+        return None
+
     def get_by_slug(self, slug):
         return self.get(slug=slug)
 
@@ -93,6 +221,10 @@ class BaseContactPoint(models.Model):
     is_other_required = models.BooleanField(_('required other'), default=False, blank=True)
     other_requirements = models.TextField(_('other requirements'), blank=True)
 
+    # `contact.bitmask` encoding of the features and requirements, maintained on save
+    features_mask = bitmask.BitmaskField(_('features mask'), default=0, editable=False)
+    requirements_mask = bitmask.BitmaskField(_('requirements mask'), default=0, editable=False)
+
     created_at = models.DateTimeField(_('created at'), default=timezone.now)
 
     def has_downsides(self):
@@ -129,6 +261,11 @@ class BaseContactPoint(models.Model):
         if not self.slug:
             base = self.title if self.title else '{}_{}'.format(self.organisation.title, self.category.title)
             self.slug = slugify(unidecode(base))
+        masks = bitmask.encode(self)
+        for mask_name, mask in masks.items():
+            setattr(self, mask_name, mask)
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = set(kwargs['update_fields']).union(masks)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -1,4 +1,9 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils.encoding import force_text
 from watson import search as watson
+from watson.models import SearchEntry
+
 
 class ContactPointSearchAdapter(watson.SearchAdapter):
 
@@ -10,7 +15,7 @@ class ContactPointSearchAdapter(watson.SearchAdapter):
 
         The default implementation returns `unicode(obj)`.
         """
-        return "{} {}".format(obj.category.title, obj.title_or_organisation)
+        return "{} {}".format(obj.category.title, obj.title_or_organisation())
 
     def get_description(self, obj):
         """
@@ -22,8 +27,9 @@ class ContactPointSearchAdapter(watson.SearchAdapter):
 
         The default implementation returns `u""`.
         """
-        keywords = list(obj.keywords.values_list('title', flat=True))
-        return obj.slug + " ".join(keywords)
+        # iterating `all()` reuses prefetched keywords when indexing in batches
+        keywords = [keyword.title for keyword in obj.keywords.all()]
+        return obj.slug + " " + " ".join(keywords)
 
     def get_content(self, obj):
         """
@@ -35,3 +41,66 @@ class ContactPointSearchAdapter(watson.SearchAdapter):
         The default implementation returns all the registered fields in your model joined together.
         """
         return obj.description
+
+
+"""
+Rebuilds the search entries for all contact points in `queryset`.
+Each batch costs one joined query for the points with their categories and organisations,
+one query for their keywords, one delete and one bulk insert of the search entries.
+With `only_changed` the existing entries are fetched too and only those whose
+title, description or content differ are replaced.
+"""
+def rebuild_index(queryset, engine=watson.default_search_engine, batch_size=500, only_changed=False):
+    model = queryset.model
+    adapter = engine.get_adapter(model)
+    content_type = ContentType.objects.get_for_model(model)
+    entries = SearchEntry.objects.filter(engine_slug=engine._engine_slug, content_type=content_type)
+    queryset = queryset.select_related('category', 'organisation').prefetch_related('keywords').order_by('pk')
+
+    count = 0
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        documents = dict((obj.pk, (
+            adapter.get_title(obj),
+            adapter.get_description(obj),
+            adapter.get_content(obj),
+        )) for obj in batch)
+        if only_changed:
+            existing = entries.filter(object_id_int__in=list(documents)) \
+                .values_list('object_id_int', 'title', 'description', 'content')
+            for entry in existing:
+                if documents.get(entry[0]) == tuple(entry[1:]):
+                    del documents[entry[0]]
+            batch = [obj for obj in batch if obj.pk in documents]
+            if not batch:
+                continue
+        with transaction.atomic():
+            entries.filter(object_id_int__in=list(documents)).delete()
+            SearchEntry.objects.bulk_create([SearchEntry(
+                engine_slug=engine._engine_slug,
+                content_type=content_type,
+                object_id=force_text(obj.pk),
+                object_id_int=obj.pk,
+                title=documents[obj.pk][0],
+                description=documents[obj.pk][1],
+                content=documents[obj.pk][2],
+                url=adapter.get_url(obj),
+                meta_encoded=adapter.serialize_meta(obj),
+            ) for obj in batch])
+        count += len(batch)
+
+    return count
+
+
+"""
+Removes search entries of contact points that no longer exist
+"""
+def remove_stale_entries(model, engine=watson.default_search_engine):
+    content_type = ContentType.objects.get_for_model(model)
+    stale = SearchEntry.objects.filter(engine_slug=engine._engine_slug, content_type=content_type) \
+        .exclude(object_id_int__in=model._default_manager.values('pk'))
+    stale.delete()
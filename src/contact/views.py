@@ -7,6 +7,7 @@ from security.decorators import security_rule
 from django.views.generic.base import View
 from django.utils.translation import ugettext_lazy as _
 from django.http import Http404
+from django.core.exceptions import ValidationError
 
 from .forms import get_contactpoint_from
 from .apps import setting
@@ -52,18 +53,50 @@ class ListView(View):
         sorting = form.get_sorting(score)
         start = form.get_start()
         limit = form.get_limit()
-        points = ContactPointModel.objects.apply_criteria(score, filters, sorting, term)
-        total = points.count()
-        if total == 0 and term and LooseSearchBackend:
-            is_loose_search = True
-            points = ContactPointModel.objects.apply_criteria(score, filters, sorting, term, LooseSearchBackend)
-            total = points.count()
+        try:
+            cursor = form.get_cursor(sorting)
+        except ValidationError as e:
+            raise failure.add_error(prefix+'form', {'cursor': e.messages})
+
+        top_page = None
+        if cursor is None and not form.has_criteria():
+            top_page = ContactPointModel.objects.get_top_page(sorting, start, limit)
+
+        if cursor is not None:
+            # following a cursor skips counting, which would cost as much as the offset it replaces
+            total = None
+            is_loose_search = cursor.is_loose_search
+            points = ContactPointModel.objects.apply_criteria_after(score, filters, sorting, (cursor.value, cursor.pk),
+                                                                    limit, term,
+                                                                    LooseSearchBackend if is_loose_search else None)
+        elif top_page is not None:
+            total, points = top_page
+        else:
+            total, points = ContactPointModel.objects.apply_criteria_page(score, filters, sorting, start, limit, term)
+            if total == 0 and term and LooseSearchBackend:
+                is_loose_search = True
+                total, points = ContactPointModel.objects.apply_criteria_page(score, filters, sorting, start, limit,
+                                                                              term, LooseSearchBackend)
+
+        facets = None
+        # the counts don't change with paging, so clients ask for them once per criteria
+        if form.wants_facets():
+            facets = ContactPointModel.objects.get_facet_counts(filters, term,
+                                                                LooseSearchBackend if is_loose_search else None,
+                                                                form.get_criteria_hash())
+
+        next_cursor = form.make_next_cursor(sorting, points, limit, is_loose_search)
+        next_url = None
+        if next_cursor is not None:
+            params = request.GET.copy()
+            params.pop(form['start'].html_name, None)
+            params[form['cursor'].html_name] = next_cursor
+            next_url = request.path + '?' + params.urlencode()
 
         try:
-            pages = RestfulPaging(total, form.get_start(), form.get_limit())
+            pages = RestfulPaging(total, start, limit)
         except:
             pages = None
-        points = points[start:(start+limit)]
         return {
              "total": total,
              "term": term,
@@ -73,6 +106,9 @@ class ListView(View):
              "pages": pages,
              "points": points,
              "limit": limit,
+             "facets": facets,
+             "cursor": next_cursor,
+             "next": next_url,
         }
 
     @security_rule('contact.contactpoint_create')
@@ -1,11 +1,15 @@
 from django.db import models
-from django.db.models import Q
+from django.db.models import Q, F, Avg, Count, Sum, Case, When, Value, IntegerField, FloatField
 from django.utils import timezone
 from django.conf import settings
 from django.utils.translation import ugettext_lazy as _
 from .apps import setting
 
 
+def plus_minus_one(fieldname):
+    return Case(When(Q(**{fieldname: True}), then=Value(1)), default=Value(-1), output_field=IntegerField())
+
+
 class ContactPointFeedbackedMixin(models.Model):
     class Meta:
         abstract = True
@@ -17,7 +21,12 @@ class ContactPointFeedbackedMixin(models.Model):
 
     def precalculate_feedback_stats(self, feedback_list=None):
         if not feedback_list:
-            feedback_list = self.feedback.published()
+            stats = self.feedback.published_stats()
+            self.rating = stats['rating'] or 0
+            self.effectiveness = stats['effectiveness'] or 0
+            self.accessibility = stats['accessibility'] or 0
+            self.feedback_count = stats['feedback_count']
+            return
 
         ratings = []
         effectiveness = 0
@@ -40,6 +49,24 @@ class ContactPointFeedbackedMixin(models.Model):
         self.rating = sum(ratings)/count
         self.feedback_count = count
 
+    """
+    Adjusts the stored stats of a single point by the contribution of feedback that
+    was published, unpublished, changed or deleted, using one atomic UPDATE.
+    The deltas are the differences of `ContactPointFeedback.stats_contribution`.
+    """
+    @classmethod
+    def apply_feedback_delta(cls, pk, count, rating, effectiveness, accessibility):
+        cls._default_manager.filter(pk=pk).update(
+            rating=Case(
+                When(feedback_count=-count, then=Value(0.0)),
+                default=(F('rating') * F('feedback_count') + rating) / (F('feedback_count') + count),
+                output_field=FloatField(),
+            ),
+            effectiveness=F('effectiveness') + effectiveness,
+            accessibility=F('accessibility') + accessibility,
+            feedback_count=F('feedback_count') + count,
+        )
+
 
 
 
@@ -59,6 +86,17 @@ class ContactPointFeedbackManager(models.Manager):
             base = self.filter(Q(is_public=True) | Q(user=user))
         return base.order_by('-added_at').select_related('user')
 
+    """
+    Same statistics as `ContactPointFeedbackedMixin.precalculate_feedback_stats`, computed with one aggregate query
+    """
+    def published_stats(self):
+        return self.public_base().aggregate(
+            feedback_count=Count('pk'),
+            rating=Avg('rating'),
+            effectiveness=Sum(plus_minus_one('is_effective')),
+            accessibility=Sum(plus_minus_one('is_easy')),
+        )
+
 
 class ContactPointFeedback(models.Model):
     class Meta:
@@ -79,3 +117,11 @@ class ContactPointFeedback(models.Model):
     rating = models.PositiveIntegerField(verbose_name=_("Overall rating"), choices=PERFORMANCE_CHOICES, blank=False, default=0)
     comment = models.TextField(_('description'), null=True, blank=True)
     contactpoint = models.ForeignKey(setting('CONTACT_POINT_MODEL', noparse=True), related_name='feedback')
+
+    """
+    What this feedback adds to the stats of its contact point: (count, rating, effectiveness, accessibility)
+    """
+    def stats_contribution(self):
+        if not self.is_public:
+            return 0, 0, 0, 0
+        return 1, self.rating, 1 if self.is_effective else -1, 1 if self.is_easy else -1
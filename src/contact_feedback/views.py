@@ -12,6 +12,8 @@ from .forms import get_feedbackfrom
 from .apps import setting
 from .signals import post_submit
 
+ContactPointModel = setting('CONTACT_POINT_MODEL')
+
 
 @restful_view_templates
 class ListView(View):
@@ -56,7 +58,6 @@ class ListView(View):
         if self.contactpoint:
             return self.contactpoint
 
-        ContactPointModel = setting('CONTACT_POINT_MODEL')
         try:
             self.contactpoint = ContactPointModel.objects.get_by_slug(slug)
         except ContactPointModel.DoesNotExist:
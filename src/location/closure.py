@@ -0,0 +1,95 @@
+from django.db.models import Q
+
+from signali.cache import VersionedCache
+
+
+class AreaClosure(object):
+    """
+    Ancestors and descendants of every area of a tree, loaded with a single query.
+    """
+
+    def __init__(self, rows, tree_id_attr='tree_id', left_attr='lft', right_attr='rght'):
+        self._range_attrs = (tree_id_attr, left_attr, right_attr)
+        self._parents = {}
+        self._bounds = {}
+        self._children = {}
+        for pk, parent_id, tree_id, lft, rght in rows:
+            self._parents[pk] = parent_id
+            self._bounds[pk] = (tree_id, lft, rght)
+            self._children.setdefault(parent_id, []).append(pk)
+        self._ancestors = {}
+        self._descendants = {}
+        for pk in self._parents:
+            self.ancestors(pk)
+            self.descendants(pk)
+
+    def __contains__(self, pk):
+        return pk in self._parents
+
+    def ancestors(self, pk):
+        if pk not in self._ancestors:
+            parent_id = self._parents[pk]
+            self._ancestors[pk] = () if parent_id is None else self.ancestors(parent_id) + (parent_id,)
+        return self._ancestors[pk]
+
+    def descendants(self, pk):
+        if pk not in self._descendants:
+            descendants = []
+            stack = list(self._children.get(pk, ()))
+            while stack:
+                child = stack.pop()
+                descendants.append(child)
+                stack.extend(self._children.get(child, ()))
+            self._descendants[pk] = tuple(descendants)
+        return self._descendants[pk]
+
+    """
+    Same areas as MPTT `get_family()`: the ancestors, the area itself and its descendants
+    """
+    def family(self, pk):
+        return set(self.ancestors(pk)).union((pk,), self.descendants(pk))
+
+    def bounds(self, pk):
+        return self._bounds[pk]
+
+    """
+    Filter matching `lookup` against the family of the area. Large subtrees are matched
+    with a lft/rght range over the related area instead of a long IN list.
+    """
+    def family_filter(self, pk, lookup, max_ids=500):
+        if len(self.descendants(pk)) < max_ids:
+            return Q(**{lookup + '__in': self.family(pk)})
+        tree_id, lft, rght = self.bounds(pk)
+        tree_id_attr, left_attr, right_attr = self._range_attrs
+        return Q(**{lookup + '__in': self.ancestors(pk) + (pk,)}) | Q(**{
+            lookup + '__' + tree_id_attr: tree_id,
+            lookup + '__' + left_attr + '__gt': lft,
+            lookup + '__' + right_attr + '__lt': rght,
+        })
+
+
+class AreaClosureCache(VersionedCache):
+    """
+    Keeps the closure of an area model in memory for the life of the process.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        super().__init__('location:closure:{}.{}:version'.format(model._meta.app_label, model._meta.model_name),
+                         self._load)
+
+    def _load(self):
+        mptt = self.model._mptt_meta
+        rows = self.model._default_manager.values_list(
+            'pk', mptt.parent_attr, mptt.tree_id_attr, mptt.left_attr, mptt.right_attr
+        )
+        return AreaClosure(rows, mptt.tree_id_attr, mptt.left_attr, mptt.right_attr)
+
+
+_caches = {}
+
+
+def get_closure_cache(model):
+    if model not in _caches:
+        _caches[model] = AreaClosureCache(model)
+    return _caches[model]
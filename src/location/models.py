@@ -4,6 +4,8 @@ from django.utils.translation import ugettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
 from mptt.managers import TreeManager
 
+from .closure import get_closure_cache
+
 
 class AreaManager(TreeManager):
     def count_size(self, include=None, exclude=None):
@@ -12,6 +14,19 @@ class AreaManager(TreeManager):
         else:
             return self.filter(size__in=[include]).count()
 
+    """
+    In-memory ancestors and descendants of all areas, see `location.closure.AreaClosure`
+    """
+    def closure(self):
+        return get_closure_cache(self.model).get()
+
+    def invalidate_closure(self):
+        get_closure_cache(self.model).invalidate()
+
+    def rebuild(self):
+        super().rebuild()
+        self.invalidate_closure()
+
 
 class BaseArea(MPTTModel):
     objects = AreaManager()
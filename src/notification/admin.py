@@ -0,0 +1,11 @@
+from django.contrib import admin
+from .models import OutgoingEmail
+
+
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'to', 'created_at', 'sent_at', 'attempts')
+    list_filter = ('sent_at',)
+    search_fields = ('subject', 'to')
+
+
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
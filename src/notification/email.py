@@ -1,16 +1,26 @@
+import json
+import smtplib
+from collections import OrderedDict
+from datetime import timedelta
+from threading import local
+
 from django.template import RequestContext
 from django.conf import settings
 from django.http import HttpRequest
 from django.template.loader import get_template
 from django.core.mail import EmailMessage, EmailMultiAlternatives, get_connection as django_get_connection
+from django.db.models import F
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
+from .models import OutgoingEmail
+
 
 class MissingConnectionException(Exception):
     pass
 
 
-def send(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply_to=settings.DEFAULT_FROM_EMAIL, request=None, internal=False, **kwargs):
+def render(templatename_without_ext, request=None, **kwargs):
     if request is None:
         request = HttpRequest()
 
@@ -26,6 +36,11 @@ def send(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply
     except:
         html = None
 
+    return subject, text, html
+
+
+def send(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply_to=settings.DEFAULT_FROM_EMAIL, request=None, internal=False, **kwargs):
+    subject, text, html = render(templatename_without_ext, request, **kwargs)
     headers = {'Reply-To': reply_to}
 
     if not isinstance(to, (list, tuple)):
@@ -35,15 +50,111 @@ def send(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply
     send_raw(subject, text, sender, to, headers, connection_label, html)
 
 
-def send_raw(subject, text, sender, to, headers, connection_label=None, html=None):
-    connection = get_connection(connection_label)
+"""
+Same as `send`, but stores the rendered email in the outbox instead of delivering it.
+When called inside a transaction the email becomes visible to `send_queued` only after commit.
+"""
+def queue(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply_to=settings.DEFAULT_FROM_EMAIL, request=None, internal=False, **kwargs):
+    outgoing = prepare(templatename_without_ext, to, sender, reply_to, request, internal, **kwargs)
+    outgoing.save()
+    return outgoing
+
+
+"""
+Renders an unsaved outbox entry, for callers that `bulk_create` many of them
+"""
+def prepare(templatename_without_ext, to, sender=settings.DEFAULT_FROM_EMAIL, reply_to=settings.DEFAULT_FROM_EMAIL, request=None, internal=False, **kwargs):
+    subject, text, html = render(templatename_without_ext, request, **kwargs)
+    headers = {'Reply-To': reply_to}
+
+    if not isinstance(to, (list, tuple)):
+        to = [to]
+
+    return OutgoingEmail(
+        subject=subject,
+        text=text,
+        html=html,
+        sender=sender,
+        to=json.dumps(list(to)),
+        headers=json.dumps(headers),
+        connection_label=settings.EMAIL_CONNECTION_LABEL_INTERNAL if internal else None,
+    )
+
+
+def build_message(subject, text, sender, to, headers, html=None):
     if html is None:
-        msg = EmailMessage(subject, text, sender, to, headers=headers, connection=connection)
-    else:
-        msg = EmailMultiAlternatives(subject, text, sender, to, headers=headers, connection=connection)
-        msg.attach_alternative(html, "text/html")
+        return EmailMessage(subject, text, sender, to, headers=headers)
+    msg = EmailMultiAlternatives(subject, text, sender, to, headers=headers)
+    msg.attach_alternative(html, "text/html")
+    return msg
 
-    msg.send(fail_silently=False)
+
+def send_raw(subject, text, sender, to, headers, connection_label=None, html=None):
+    msg = build_message(subject, text, sender, to, headers, html)
+    connection_pool.send([msg], connection_label)
+
+
+"""
+Delivers due emails from the outbox through the pooled connection of their label.
+Each batch is claimed first, so overlapping runs never deliver the same email twice.
+Failed emails are retried with exponential backoff until `max_attempts` is reached.
+"""
+def send_queued(batch_size=100, max_attempts=5):
+    sent = 0
+    while True:
+        batch = OutgoingEmail.objects.claim(max_attempts, batch_size)
+        if not batch:
+            return sent
+
+        by_label = OrderedDict()
+        for outgoing in batch:
+            by_label.setdefault(outgoing.connection_label, []).append(outgoing)
+        for label, emails in by_label.items():
+            sent += _send_label(label, emails)
+
+
+"""
+Sends the emails over one pooled connection. When the connection can't be opened, or is lost
+and can't be reopened, the remaining emails of the label are postponed without reconnecting for each.
+"""
+def _send_label(label, emails):
+    sent = 0
+    for i, outgoing in enumerate(emails):
+        try:
+            connection_pool.get(label)
+        except Exception as e:
+            for pending in emails[i:]:
+                _postpone(pending, e)
+            break
+
+        msg = build_message(outgoing.subject, outgoing.text, outgoing.sender, json.loads(outgoing.to),
+                            json.loads(outgoing.headers), outgoing.html)
+        try:
+            connection_pool.send([msg], label)
+        except Exception as e:
+            _postpone(outgoing, e)
+            if label not in connection_pool:
+                for pending in emails[i+1:]:
+                    _postpone(pending, e)
+                break
+            continue
+        _release(outgoing, attempts=F('attempts') + 1, sent_at=timezone.now())
+        sent += 1
+    return sent
+
+
+def _postpone(outgoing, error):
+    _release(outgoing,
+             attempts=F('attempts') + 1,
+             last_error=str(error),
+             send_after=timezone.now() + timedelta(minutes=2 ** (outgoing.attempts + 1)))
+
+
+"""
+Updates a claimed email and clears the claim, unless the claim expired and was taken over by another run
+"""
+def _release(outgoing, **values):
+    OutgoingEmail.objects.filter(pk=outgoing.pk, claimed_at=outgoing.claimed_at).update(claimed_at=None, **values)
 
 
 def get_connection(label=None, **kwargs):
@@ -52,11 +163,60 @@ def get_connection(label=None, **kwargs):
 
     try:
         connections = settings.EMAIL_CONNECTIONS
-        options = connections[label]
+        options = dict(connections[label], **kwargs)
     except (KeyError, AttributeError):
         raise MissingConnectionException(
-            _('Settings for connection "%(connection_label)s" were not found') % {'label': label}
+            _('Settings for connection "%(connection_label)s" were not found') % {'connection_label': label}
         )
 
-    options.update(kwargs)
-    return django_get_connection(**options)
\ No newline at end of file
+    return django_get_connection(**options)
+
+
+class ConnectionPool(local):
+    """
+    Keeps one open (and authenticated) connection per connection label and thread,
+    so consecutive emails skip the handshake and login.
+    A connection dropped by the server is reopened once before giving up.
+    """
+
+    def __init__(self):
+        self._connections = {}
+
+    def __contains__(self, label):
+        return label in self._connections
+
+    def get(self, label=None):
+        connection = self._connections.get(label)
+        if connection is None:
+            connection = get_connection(label)
+            connection.open()
+            self._connections[label] = connection
+        return connection
+
+    def discard(self, label=None):
+        connection = self._connections.pop(label, None)
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def close(self):
+        for label in list(self._connections):
+            self.discard(label)
+
+    def send(self, messages, label=None):
+        try:
+            return self.get(label).send_messages(messages)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self.discard(label)
+        try:
+            return self.get(label).send_messages(messages)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # not kept, so callers can tell the connection is gone
+            self.discard(label)
+            raise
+
+
+connection_pool = ConnectionPool()
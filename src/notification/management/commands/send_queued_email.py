@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from notification.email import send_queued, connection_pool
+
+
+class Command(BaseCommand):
+    help = 'Sends the emails waiting in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100)
+        parser.add_argument('--max-attempts', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            sent = send_queued(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+        finally:
+            connection_pool.close()
+        print('Sent {} emails'.format(sent))
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutgoingEmail',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID', auto_created=True)),
+                ('subject', models.CharField(verbose_name='subject', max_length=998)),
+                ('text', models.TextField(verbose_name='text')),
+                ('html', models.TextField(blank=True, null=True, verbose_name='html')),
+                ('sender', models.CharField(verbose_name='sender', max_length=255)),
+                ('to', models.TextField(verbose_name='recipients')),
+                ('headers', models.TextField(default='{}', verbose_name='headers')),
+                ('connection_label', models.CharField(blank=True, null=True, verbose_name='connection label', max_length=100)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Added at')),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now, verbose_name='send after', db_index=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='sent at')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('last_error', models.TextField(blank=True, verbose_name='last error')),
+            ],
+            options={
+                'verbose_name': 'outgoing email',
+                'verbose_name_plural': 'outgoing emails',
+            },
+        ),
+    ]
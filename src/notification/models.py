@@ -1,4 +1,7 @@
-from django.db import models
+from datetime import timedelta
+
+from django.db import models, transaction
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.conf import settings
@@ -16,3 +19,52 @@ class BaseSubscriber(models.Model):
     email = models.EmailField(_('email'), max_length=250, blank=True, null=True)
     last_notified_at = models.DateTimeField(_('Last notified at'), default=timezone.now)
     created_at = models.DateTimeField(_('Added at'), default=timezone.now)
+
+
+class OutgoingEmailManager(models.Manager):
+    # a claim older than this is from a worker that died while sending
+    CLAIM_TIMEOUT = timedelta(minutes=15)
+
+    def due(self, max_attempts, now=None):
+        if now is None:
+            now = timezone.now()
+        return self.filter(sent_at=None, send_after__lte=now, attempts__lt=max_attempts)\
+            .filter(Q(claimed_at=None) | Q(claimed_at__lt=now - self.CLAIM_TIMEOUT))\
+            .order_by('send_after')
+
+    """
+    Marks up to `batch_size` due emails as claimed at `now` and returns them.
+    The rows are locked while claiming, so overlapping workers never get the same email.
+    """
+    def claim(self, max_attempts, batch_size, now=None):
+        if now is None:
+            now = timezone.now()
+        with transaction.atomic():
+            pks = list(self.due(max_attempts, now).select_for_update().values_list('pk', flat=True)[:batch_size])
+            self.filter(pk__in=pks).update(claimed_at=now)
+        return list(self.filter(pk__in=pks, claimed_at=now).order_by('send_after'))
+
+
+class OutgoingEmail(models.Model):
+    """
+    Rendered email waiting in the outbox for `manage.py send_queued_email`
+    """
+    class Meta:
+        verbose_name = _('outgoing email')
+        verbose_name_plural = _('outgoing emails')
+
+    objects = OutgoingEmailManager()
+
+    subject = models.CharField(_('subject'), max_length=998)
+    text = models.TextField(_('text'))
+    html = models.TextField(_('html'), null=True, blank=True)
+    sender = models.CharField(_('sender'), max_length=255)
+    to = models.TextField(_('recipients'))
+    headers = models.TextField(_('headers'), default='{}')
+    connection_label = models.CharField(_('connection label'), max_length=100, null=True, blank=True)
+    created_at = models.DateTimeField(_('Added at'), default=timezone.now)
+    send_after = models.DateTimeField(_('send after'), default=timezone.now, db_index=True)
+    sent_at = models.DateTimeField(_('sent at'), null=True, blank=True)
+    claimed_at = models.DateTimeField(_('claimed at'), null=True, blank=True)
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    last_error = models.TextField(_('last error'), blank=True)
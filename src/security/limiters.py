@@ -0,0 +1,104 @@
+import importlib
+from threading import Lock
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+
+from .models import Limit
+
+
+class DatabaseLimiter(object):
+    """
+    Keeps counters in `Limit` rows. Costs a read and a write per check.
+    """
+
+    def hit(self, action, limit, seconds, user=None, ip=None):
+        now = time()
+        user_action = Limit.objects.filter(action=action, user=user, ip=ip).order_by('-pk').first()
+        if user_action is None:
+            user_action = Limit(action=action, user=user, ip=ip, last_executed_timestamp=now, count=0)
+        elif now - user_action.last_executed_timestamp > seconds:
+            user_action.count = 0
+            user_action.last_executed_timestamp = now
+
+        if user_action.count >= limit:
+            return False
+
+        user_action.count += 1
+        user_action.save()
+        return True
+
+
+class KeyLimiter(object):
+    @staticmethod
+    def make_key(action, user=None, ip=None):
+        if user is not None:
+            return 'ratelimit:{}:user:{}'.format(action, user.pk)
+        return 'ratelimit:{}:ip:{}'.format(action, ip)
+
+
+class RedisLimiter(KeyLimiter):
+    """
+    Sliding window in redis: the timestamps of the allowed actions of the last `seconds` are kept in a sorted set,
+    so unlike a fixed window no more than `limit` actions pass across a window boundary.
+    Pruning, counting and adding are done by one script, so a check is a single atomic round trip.
+    """
+    script = """
+        local now = tonumber(ARGV[1])
+        local seconds = tonumber(ARGV[2])
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - seconds)
+        if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+            return 0
+        end
+        redis.call('ZADD', KEYS[1], now, ARGV[4])
+        redis.call('EXPIRE', KEYS[1], math.ceil(seconds))
+        return 1
+    """
+
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+        self._hit = None
+
+    def hit(self, action, limit, seconds, user=None, ip=None):
+        if self._hit is None:
+            from django_redis import get_redis_connection
+            self._hit = get_redis_connection(self.cache_alias).register_script(self.script)
+        now = time()
+        # members must be unique, two actions may share a timestamp
+        member = '{:.6f}:{}'.format(now, uuid4().hex)
+        return self._hit(keys=[self.make_key(action, user, ip)], args=[now, seconds, limit, member]) == 1
+
+
+class MemoryLimiter(KeyLimiter):
+    """
+    Process-local counters. Only suitable for development and single-process deployments.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._windows = {}
+
+    def hit(self, action, limit, seconds, user=None, ip=None):
+        key = self.make_key(action, user, ip)
+        now = time()
+        with self._lock:
+            started_at, count = self._windows.get(key, (now, 0))
+            if now - started_at > seconds:
+                started_at, count = now, 0
+            if count >= limit:
+                return False
+            self._windows[key] = (started_at, count + 1)
+            return True
+
+
+_limiter = None
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        path = getattr(settings, 'SECURITY_RATE_LIMITER', 'security.limiters.DatabaseLimiter')
+        module, name = path.rsplit('.', 1)
+        _limiter = getattr(importlib.import_module(module), name)()
+    return _limiter
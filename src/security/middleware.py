@@ -0,0 +1,10 @@
+class RateLimitCookieMiddleware(object):
+    """
+    Sets the signed counters produced by `security.rules.rate_limit_by_cookie`.
+    Keeping them in cookies instead of the session spares a session write per check.
+    """
+
+    def process_response(self, request, response):
+        for name, (value, salt, max_age) in getattr(request, 'rate_limit_cookies', {}).items():
+            response.set_signed_cookie(name, value, salt=salt, max_age=max_age, httponly=True)
+        return response
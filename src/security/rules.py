@@ -1,10 +1,11 @@
-import json
+import hashlib
 from time import time
 
 import rules
 from ipware.ip import get_real_ip
+from django.core import signing
 
-from .models import Limit
+from .limiters import get_limiter
 
 
 @rules.predicate
@@ -12,6 +13,10 @@ def is_same_person(user, target_user):
     return user == target_user
 
 
+def get_rate_limit_cookie_name(key):
+    return 'ratelimit_' + hashlib.md5(key.encode()).hexdigest()[:16]
+
+
 def rate_limit_by_cookie(action, limit=1, seconds=3600):
     @rules.predicate(bind=True)
     def request_rate_limit_by_cookie(self, user, request):
@@ -19,20 +24,26 @@ def rate_limit_by_cookie(action, limit=1, seconds=3600):
             self.skip()
         now = time()
         key = "{}:{}".format(action, request.path)
+        name = get_rate_limit_cookie_name(key)
         try:
-            last_action = json.loads(request.session.get(key))
-            assert ((now - last_action["timestamp"]) <= seconds)
-        except:
-            last_action = {
-                "count": 0,
-                "timestamp": time()
-            }
-
-        if last_action["count"] >= limit:
+            count, timestamp = request.get_signed_cookie(name, salt=key).split(':')
+            count, timestamp = int(count), float(timestamp)
+        except (KeyError, ValueError, signing.BadSignature):
+            count, timestamp = 0, now
+        if now - timestamp > seconds:
+            count, timestamp = 0, now
+
+        if count >= limit:
             return False
 
-        last_action["count"] += 1
-        request.session[key] = json.dumps(last_action)
+        # written to the response by `security.middleware.RateLimitCookieMiddleware`
+        if not hasattr(request, 'rate_limit_cookies'):
+            request.rate_limit_cookies = {}
+        request.rate_limit_cookies[name] = (
+            "{}:{}".format(count + 1, timestamp),
+            key,
+            int(timestamp + seconds - now) + 1,
+        )
         return True
 
     return request_rate_limit_by_cookie
@@ -44,23 +55,8 @@ def rate_limit_by_user(action, limit=1, seconds=3600):
         if not user.is_authenticated():
             self.skip()
 
-        now = time()
         key = "{}:{}".format(action, request.path)
-        try:
-            user_action = Limit.objects.get(action=key, user=user)
-            seconds_since_last_executon = now - user_action.last_executed_timestamp
-            if seconds_since_last_executon > seconds:
-                user_action.count = 0
-                user_action.last_executed_timestamp = time()
-        except:
-            user_action = Limit(action=key, user=user, last_executed_timestamp=time(), count=0)
-
-        if user_action.count >= limit:
-            return False
-
-        user_action.count += 1
-        user_action.save()
-        return True
+        return get_limiter().hit(key, limit, seconds, user=user)
 
     return request_rate_limit_by_user
 
@@ -74,21 +70,6 @@ def rate_limit_by_ip(action, limit=1, seconds=3600):
         if ip is None:
             self.skip()
 
-        now = time()
-        try:
-            user_action = Limit.objects.get(action=action, ip=ip)
-            seconds_since_last_executon = now - user_action.last_executed_timestamp
-            if seconds_since_last_executon > seconds:
-                user_action.count = 0
-                user_action.last_executed_timestamp = time()
-        except:
-            user_action = Limit(action=action, ip=ip, last_executed_timestamp=time(), count=0)
-
-        if user_action.count >= limit:
-            return False
-
-        user_action.count += 1
-        user_action.save()
-        return True
+        return get_limiter().hit(action, limit, seconds, ip=ip)
 
     return request_rate_limit_by_ip
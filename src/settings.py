@@ -203,6 +203,8 @@ MIDDLEWARE_CLASSES = (
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'watson.middleware.SearchContextMiddleware',
+    'security.middleware.RateLimitCookieMiddleware',
+    'signali_contact.middleware.ParentRollupMiddleware',
     # 'restful.error_handler.ErrorHandler',
     'restful.middleware.TemplateExtensionByAcceptedType',
 )
@@ -282,9 +284,17 @@ CONTACT_CATEGORY_MODEL = 'signali_taxonomy.Category'
 CONTACT_AREA_MODEL = 'signali_location.Area'
 CONTACT_FEEDBACK_MODEL = 'signali_contact.SignalContactPointFeedback'
 CONTACT_POINT_LOOSE_SEARCH_BACKEND = 'signali.search.SignaliPostgresBackend'
+# queue search index updates for `manage.py process_search_queue` instead of indexing on save
+CONTACT_POINT_INDEX_QUEUE = env('CONTACT_POINT_INDEX_QUEUE', False)
+# collect visits in redis for `manage.py flush_visits` instead of updating the database on each visit
+CONTACT_POINT_VISIT_BUFFER = env('CONTACT_POINT_VISIT_BUFFER', False)
 
 ACCESSIBILITY_PAGE_MODEL = 'signali_accessibility.Page'
 
+# where rate limit counters are kept, `security.limiters.DatabaseLimiter` is the fallback;
+# the redis limiter uses a sliding window, the database and memory ones a fixed window that allows bursts of 2x the limit
+SECURITY_RATE_LIMITER = 'security.limiters.RedisLimiter'
+
 THUMBNAIL_ENGINE = 'signali.sorl.SignaliPilEngine'
 THUMBNAIL_KVSTORE = 'sorl.thumbnail.kvstores.redis_kvstore.KVStore'
 THUMBNAIL_QUALITY = 100
@@ -306,6 +316,8 @@ CACHEOPS = {
     'signali_accessibility.*': {'ops': 'all', 'timeout': 60*60*5}, # 5 hours
     'signali_location.*': {'ops': 'all', 'timeout': 60*60*5}, # 5 hours
     'signali.*': {'ops': 'all', 'timeout': 60*60*5}, # 5 hours
+    # not cached itself, only a dependency of `cached_as` results
+    'watson.searchentry': {'ops': (), 'timeout': 60*60*5}, # 5 hours
 }
 CACHES = {
     "default": {
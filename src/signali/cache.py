@@ -0,0 +1,33 @@
+from time import time
+
+from django.core.cache import cache
+
+
+class VersionedCache(object):
+    """
+    Keeps the value returned by `loader` in memory for the life of the process.
+    Invalidation bumps a shared version, which other processes check at most every `check_interval` seconds.
+    """
+    VERSION_CHECK_INTERVAL = 10
+
+    def __init__(self, version_cache_key, loader, check_interval=None):
+        self.version_cache_key = version_cache_key
+        self.loader = loader
+        self.check_interval = self.VERSION_CHECK_INTERVAL if check_interval is None else check_interval
+        self._value = None
+        self._version = None
+        self._checked_at = 0
+
+    def get(self):
+        now = time()
+        if self._value is None or now - self._checked_at > self.check_interval:
+            version = cache.get(self.version_cache_key)
+            if self._value is None or version != self._version:
+                self._value = self.loader()
+                self._version = version
+            self._checked_at = now
+        return self._value
+
+    def invalidate(self):
+        self._value = None
+        cache.set(self.version_cache_key, time(), None)
@@ -8,6 +8,7 @@ from django.core.management.base import BaseCommand
 from signali_taxonomy.models import Category, Keyword
 from signali_location.models import Area, AreaSize
 from signali_contact.models import ContactPoint, Organisation
+from signali_contact.rollups import parent_rollups
 
 def clean(value, capitalize=True):
     value = value.strip()
@@ -23,7 +24,7 @@ class Command(BaseCommand):
         parser.add_argument('dump', type=str)
 
     def handle(self, *args, **options):
-        with transaction.atomic(), open(options["dump"]) as dump:
+        with transaction.atomic(), parent_rollups.deferred(), open(options["dump"]) as dump:
             dump = json.load(dump)
 
             if options['type'] == 'category':
@@ -1,10 +1,13 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from sorl.thumbnail import ImageField
 from accessibility.models import VisibilityMixin, VisibilityManagerMixin
 
 from .uploads import Uploader
+from .cache import VersionedCache
 
 
 
@@ -35,9 +38,22 @@ class Setting(models.Model):
     def facebook_cover_url(self):
         return self.facebook_share.url
 
+    # the main setting is kept in memory and reloaded when another process bumps the version in the cache
+    _main = VersionedCache('signali:setting:version', lambda: Setting.objects.all()[:1].get())
+
     @classmethod
     def main(cls):
-        return cls.objects.all()[:1].get()
+        return cls._main.get()
+
+    @classmethod
+    def invalidate_main(cls):
+        cls._main.invalidate()
+
+
+@receiver(post_save, sender=Setting)
+@receiver(post_delete, sender=Setting)
+def invalidate_main_setting(**kwargs):
+    Setting.invalidate_main()
 
 
 class PartnerManager(models.Manager, VisibilityManagerMixin):
@@ -2,22 +2,48 @@ import importlib
 
 from django.apps import apps as django_apps
 from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
 from .models import Setting
 
+# model and class settings resolved once by `resolve_settings`
+resolved_settings = {}
 
-def setting(name, default=None, noparse=False):
-    try:
-        value = getattr(settings, name)
-    except:
-        site_settings = Setting.main()
-        value = getattr(site_settings, name, default)
 
-    if name in settings.MODEL_SETTINGS and not noparse and isinstance(value, str):
+def parse_setting(name, value, default=None):
+    if name in settings.MODEL_SETTINGS and isinstance(value, str):
         value = django_apps.get_model(value)
 
-    if name in settings.CLASS_SETTINGS and not noparse and isinstance(value, str):
+    if name in settings.CLASS_SETTINGS and isinstance(value, str):
         module, value = value.rsplit('.', 1)
         module = importlib.import_module(module)
         value = getattr(module, value, default)
 
     return value
+
+
+def resolve_settings():
+    for name in settings.MODEL_SETTINGS + settings.CLASS_SETTINGS:
+        if not hasattr(settings, name):
+            continue
+        try:
+            value = parse_setting(name, getattr(settings, name))
+        except (LookupError, ImportError, ValueError) as e:
+            raise ImproperlyConfigured('Setting {} could not be resolved: {}'.format(name, e))
+        if value is None:
+            raise ImproperlyConfigured('Setting {} could not be resolved'.format(name))
+        resolved_settings[name] = value
+
+
+def setting(name, default=None, noparse=False):
+    if not noparse and name in resolved_settings:
+        return resolved_settings[name]
+
+    try:
+        value = getattr(settings, name)
+    except AttributeError:
+        site_settings = Setting.main()
+        value = getattr(site_settings, name, default)
+
+    if noparse:
+        return value
+    return parse_setting(name, value, default)
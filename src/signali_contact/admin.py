@@ -12,6 +12,7 @@ from signali_location.models import Area
 from signali_taxonomy.models import Category
 from location.forms import AreaAutosuggestWidget
 from .models import ContactPoint, ContactPointGrouped, Organisation, SignalContactPointFeedback
+from .rollups import parent_rollups
 
 betterDateTimePicker = BootstrapDateTimeInput(format="%d.%m.%Y %H:%M")
 
@@ -88,13 +89,16 @@ class ContactPointAdmin(BaseContactPointAdmin, AdminImageMixin):
         return qs.filter(parent=None)
 
     def save_related(self, request, form, formsets, change):
-        for formset in formsets:
-            for childform in formset.forms:
-                if not childform.cleaned_data:
-                    continue
-                childform.instance.parent = form.instance
-                childform.instance = childform.instance.get_synced_copy_of_parent(form.instance)
-        super().save_related(request, form, formsets, change)
+        # branches are saved one by one, the parent is recalculated once at the end
+        with parent_rollups.deferred():
+            for formset in formsets:
+                for childform in formset.forms:
+                    if not childform.cleaned_data:
+                        continue
+                    childform.instance.parent = form.instance
+                    childform.instance = childform.instance.get_synced_copy_of_parent(form.instance)
+            super().save_related(request, form, formsets, change)
+            parent_rollups.mark(form.instance.pk)
 
     prepopulated_fields = {"slug": ("title",)}
     suit_form_tabs = (
@@ -104,10 +108,6 @@ class ContactPointAdmin(BaseContactPointAdmin, AdminImageMixin):
         ('user-proposed', _('proposed by user')),
     )
 
-    def children_count(self, obj):
-        return obj.children.count()
-    children_count.short_description = _('Number of branches')
-
     radio_fields = dict((field, admin.HORIZONTAL) for field in extended_booelan_fields)
 
     list_per_page = 40
@@ -1,3 +1,5 @@
+from django.conf import settings
+
 from contact import apps as conttactapps
 from contact.search_watson import ContactPointSearchAdapter
 from contact_feedback import apps as feedbackapps
@@ -10,6 +12,9 @@ class SignaliContactConfig(conttactapps.ContactConfig):
         ContactPoint = self.get_model("ContactPoint")
         from . import signal_handlers
         watson.register(ContactPoint, ContactPointSearchAdapter)
+        if getattr(settings, 'CONTACT_POINT_INDEX_QUEUE', False):
+            from . import search_queue
+            search_queue.connect()
 
 
 class ContactConfig(conttactapps.ContactConfig):
@@ -20,6 +25,11 @@ class ContactConfig(conttactapps.ContactConfig):
         conttactapps.setting = setting
         super().__init__(*args, **kwargs)
 
+    def ready(self):
+        super().ready()
+        from signali.utils import resolve_settings
+        resolve_settings()
+
 
 class FeedbackConfig(feedbackapps.FeedbackConfig):
     name = 'contact_feedback'
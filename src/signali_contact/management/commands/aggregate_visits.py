@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from signali_contact.models import ContactPoint
+
+
+class Command(BaseCommand):
+    help = 'Recalculates visit statistics of grouped contact points from their branches'
+
+    def handle(self, *args, **options):
+        ContactPoint.objects.aggregate_children_visibility()
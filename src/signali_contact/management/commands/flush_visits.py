@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signali_contact.visits import visit_buffer
+
+
+class Command(BaseCommand):
+    help = 'Writes buffered contact point visits to the database'
+
+    def handle(self, *args, **options):
+        count = visit_buffer.flush()
+        print('Flushed visits of {} contact points'.format(count))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from signali_contact.search_queue import process_queue
+
+
+class Command(BaseCommand):
+    help = 'Refreshes the search index of contact points queued after changes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = process_queue(batch_size=options['batch_size'])
+        print('Processed {} queued contact points'.format(count))
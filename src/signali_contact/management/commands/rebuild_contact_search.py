@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from watson.models import SearchEntry
+from cacheops import invalidate_model
+
+from contact.search_watson import rebuild_index, remove_stale_entries
+from signali_contact.models import ContactPoint
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the search index of all contact points using batched set-based queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        count = rebuild_index(ContactPoint.objects.all().nocache(), batch_size=options['batch_size'])
+        remove_stale_entries(ContactPoint)
+        invalidate_model(SearchEntry)
+        print('Indexed {} contact points'.format(count))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signali_contact.models import ContactPoint
+
+
+class Command(BaseCommand):
+    help = 'Repairs contact point feedback stats that drifted from the published feedback'
+
+    def handle(self, *args, **options):
+        repaired = ContactPoint.objects.reconcile_feedback_stats()
+        print('Repaired feedback stats of {} contact points'.format(repaired))
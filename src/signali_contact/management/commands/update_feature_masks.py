@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signali_contact.models import ContactPoint
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the feature and requirement masks of all contact points'
+
+    def handle(self, *args, **options):
+        count = ContactPoint.objects.update_masks()
+        print('Updated masks of {} contact points'.format(count))
@@ -0,0 +1,30 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .rollups import parent_rollups
+
+
+class ParentRollupMiddleware(object):
+    """
+    Wraps the entire request in a `parent_rollups.deferred()` block,
+    so every parent marked while handling it is refreshed once at the end.
+    """
+
+    def process_request(self, request):
+        # a block left open by a request whose response never reached this middleware
+        # would otherwise swallow the marks of every later request of the thread
+        parent_rollups.reset()
+        parent_rollups.start()
+        request.parent_rollups_active = True
+
+    def _end(self, request, discard=False):
+        if getattr(request, 'parent_rollups_active', False):
+            del request.parent_rollups_active
+            parent_rollups.end(discard=discard)
+
+    def process_response(self, request, response):
+        self._end(request)
+        return response
+
+    def process_exception(self, request, exception):
+        # without ATOMIC_REQUESTS the branch writes before the exception are committed and still need their parents
+        self._end(request, discard=connections[DEFAULT_DB_ALIAS].settings_dict['ATOMIC_REQUESTS'])
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signali_contact', '0023_auto_20160119_2216'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchIndexQueue',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID', auto_created=True)),
+                ('queued_at', models.DateTimeField(verbose_name='queued at', default=django.utils.timezone.now)),
+                ('contactpoint', models.ForeignKey(related_name='+', to='signali_contact.ContactPoint')),
+            ],
+            options={
+                'verbose_name': 'search index queue entry',
+                'verbose_name_plural': 'search index queue',
+            },
+        ),
+    ]
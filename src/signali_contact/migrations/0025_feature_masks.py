@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import contact.bitmask
+
+
+def backfill_masks(apps, schema_editor):
+    ContactPoint = apps.get_model("signali_contact", "ContactPoint")
+    ContactPoint.objects.update(**contact.bitmask.mask_expressions())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signali_contact', '0024_searchindexqueue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactpoint',
+            name='features_mask',
+            field=contact.bitmask.BitmaskField(default=0, verbose_name='features mask', editable=False),
+        ),
+        migrations.AddField(
+            model_name='contactpoint',
+            name='requirements_mask',
+            field=contact.bitmask.BitmaskField(default=0, verbose_name='requirements mask', editable=False),
+        ),
+        migrations.RunPython(backfill_masks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# public parents sorted by `UserCriteriaForm.SEARCH_SORTING_CHOICES`, ties broken by id;
+# each index is scanned backwards for the descending order
+SORTED_FIELDS = (
+    'popularity',
+    'created_at',
+    'rating',
+    'effectiveness',
+    'accessibility',
+    'last_visited_at',
+)
+
+CREATE_INDEX = """
+    CREATE INDEX CONCURRENTLY signali_contact_contactpoint_top_{field}
+    ON signali_contact_contactpoint ({field}, id)
+    WHERE is_public AND parent_id IS NULL
+"""
+
+DROP_INDEX = "DROP INDEX CONCURRENTLY IF EXISTS signali_contact_contactpoint_top_{field}"
+
+
+"""
+Runs the statements outside of the migration transaction, which CONCURRENTLY can't be part of.
+Django before 1.10 ignores `Migration.atomic`, so they go through a separate autocommit connection.
+"""
+def execute_concurrently(schema_editor, statements):
+    connection = schema_editor.connection
+    concurrent = connection.__class__(connection.settings_dict.copy(), alias=connection.alias)
+    try:
+        with concurrent.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    finally:
+        concurrent.close()
+
+
+def create_indexes(apps, schema_editor):
+    statements = []
+    for field in SORTED_FIELDS:
+        # an interrupted concurrent build leaves an invalid index behind
+        statements += [DROP_INDEX.format(field=field), CREATE_INDEX.format(field=field)]
+    execute_concurrently(schema_editor, statements)
+
+
+def drop_indexes(apps, schema_editor):
+    execute_concurrently(schema_editor, [DROP_INDEX.format(field=field) for field in SORTED_FIELDS])
+
+
+class Migration(migrations.Migration):
+    # building the indexes concurrently keeps the table writable
+    atomic = False
+
+    dependencies = [
+        ('signali_contact', '0025_feature_masks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+BACKFILL_SQL = """
+    UPDATE signali_contact_contactpoint AS point SET
+        children_count = stats.children_count,
+        first_child_slug = stats.first_child_slug
+    FROM (
+        SELECT parent.id,
+            COUNT(child.id) AS children_count,
+            (ARRAY_AGG(child.slug ORDER BY child.id))[1] AS first_child_slug
+        FROM signali_contact_contactpoint AS parent
+        LEFT JOIN signali_contact_contactpoint AS child ON child.parent_id = parent.id
+        WHERE parent.parent_id IS NULL
+        GROUP BY parent.id
+    ) AS stats
+    WHERE point.id = stats.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signali_contact', '0026_top_sorting_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contactpoint',
+            name='children_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Number of branches', editable=False),
+        ),
+        migrations.AddField(
+            model_name='contactpoint',
+            name='first_child_slug',
+            field=models.SlugField(null=True, max_length=255, verbose_name='slug of the first branch', editable=False),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signali_contact', '0027_children_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VisitFlush',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False, verbose_name='ID', auto_created=True)),
+                ('flush_id', models.CharField(verbose_name='flush id', max_length=32, unique=True)),
+                ('flushed_at', models.DateTimeField(verbose_name='flushed at', default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'visit flush',
+                'verbose_name_plural': 'visit flushes',
+            },
+        ),
+    ]
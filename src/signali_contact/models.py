@@ -1,15 +1,20 @@
 from copy import copy
 
-from django.db import models
+from django.db import models, connection
+from django.core.cache import cache
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from django.db.models import Sum, Avg, Min, Q
+from django.db.models import Sum, Avg, Min, Q, F, Case, When, Value, IntegerField
 from django.template.defaultfilters import slugify
 
 from unidecode import unidecode
+from cacheops import invalidate_model, invalidate_obj, cached_as
+from watson.models import SearchEntry
 from contact.models import BaseContactPoint, ContactPointManager, BaseOrganisation
 from accessibility.models import VisibilityManagerMixin, VisibilityQuerySetMixin
 from signali_accessibility.models import SignalVisibilityMixin
 from contact_feedback.models import ContactPointFeedback, ContactPointFeedbackedMixin, ContactPointFeedbackManager
+from .rollups import parent_rollups
 
 
 class SignalPointQuerySet(models.QuerySet, VisibilityQuerySetMixin):
@@ -54,6 +59,24 @@ class SignalPointQuerySet(models.QuerySet, VisibilityQuerySetMixin):
 
 
 class SignalContactPointManager(ContactPointManager):
+    # sortings of `UserCriteriaForm.SEARCH_SORTING_CHOICES` kept as precomputed lists of public parents,
+    # `pk` being the order of relevance when there are no criteria to score
+    TOP_SORTINGS = (
+        'pk',
+        'popularity',
+        '-popularity',
+        '-created_at',
+        '-rating',
+        '-effectiveness',
+        '-accessibility',
+        '-last_visited_at',
+    )
+    TOP_LIST_SIZE = 48
+    TOP_CACHE_TIMEOUT = 60*60
+    # visits don't drop the list, it is refreshed when buffered visits are flushed or when it expires
+    TOP_CACHE_TIMEOUTS = {
+        '-last_visited_at': 60,
+    }
 
     def _transform_criteria_base(self, queryset):
         return queryset.public()
@@ -69,6 +92,288 @@ class SignalContactPointManager(ContactPointManager):
         except:
             raise ContactPoint.DoesNotExist()
 
+    """
+    Public parents in the order of `sorting`, served from the precomputed top list.
+    Only the first `TOP_LIST_SIZE` are kept, more are an error rather than a silently shorter list.
+    """
+    def top(self, sorting, count=None):
+        if count is not None and count > self.TOP_LIST_SIZE:
+            raise ValueError('Top lists keep {} contact points, {} were requested'.format(self.TOP_LIST_SIZE, count))
+        pks = self._get_top_list(sorting)['pks'][:count]
+        return self._in_order(pks)
+
+    """
+    Unlike the queryset methods of the same name, which sort every public point uncached,
+    the manager methods serve public parents from the top lists
+    """
+    def visited_last(self, count=None):
+        return self.top('-last_visited_at', count)
+
+    def added_last(self, count=None):
+        return self.top('-created_at', count)
+
+    def most_effective(self, count=None):
+        return self.top('-effectiveness', count)
+
+    def most_accessible(self, count=None):
+        return self.top('-accessibility', count)
+
+    def rated_best(self, count=None):
+        return self.top('-rating', count)
+
+    """
+    Pages past `TOP_LIST_SIZE` return None, so the caller falls back to `apply_criteria_page`
+    """
+    def get_top_page(self, sorting, start, limit):
+        top_sorting = self._get_top_sorting(sorting)
+        if top_sorting is None or start + limit > self.TOP_LIST_SIZE:
+            return None
+        top = self._get_top_list(top_sorting)
+        return top['total'], self._in_order(top['pks'][start:(start+limit)])
+
+    def invalidate_top(self, sortings=None):
+        cache.delete_many([self._get_top_cache_key(sorting) for sorting in (sortings or self.TOP_SORTINGS)])
+
+    """
+    Invalidates the cached queries that can contain the points, for changes made with raw or bulk updates
+    """
+    def invalidate_points(self, pks):
+        for point in self.filter(pk__in=pks).nocache():
+            invalidate_obj(point)
+
+    def _get_top_sorting(self, sorting):
+        if not sorting:
+            return 'pk'
+        if len(sorting) == 1 and sorting[0] in self.TOP_SORTINGS:
+            return sorting[0]
+        return None
+
+    def _get_top_cache_key(self, sorting):
+        return 'signali_contact:top:' + sorting
+
+    def _get_top_list(self, sorting):
+        key = self._get_top_cache_key(sorting)
+        top = cache.get(key)
+        if top is None:
+            parents = self.public().parents().nocache()
+            # same tie breaking as `apply_criteria`, so the list matches the uncached pages
+            fieldname, descending = self.get_keyset_ordering([] if sorting == 'pk' else [sorting])
+            orderby = ['pk'] if fieldname == 'pk' else [fieldname, 'pk']
+            if descending:
+                orderby = ['-' + name for name in orderby]
+            top = {
+                'total': parents.count(),
+                'pks': list(parents.order_by(*orderby).values_list('pk', flat=True)[:self.TOP_LIST_SIZE]),
+            }
+            cache.set(key, top, self.TOP_CACHE_TIMEOUTS.get(sorting, self.TOP_CACHE_TIMEOUT))
+        return top
+
+    def _in_order(self, pks):
+        if not pks:
+            return self.none()
+        position = Case(*[When(pk=pk, then=Value(i)) for i, pk in enumerate(pks)], output_field=IntegerField())
+        return self.public().prefetch().filter(pk__in=pks).order_by(position)
+
+    """
+    The masks are written with `update()`, which doesn't invalidate cached querysets
+    """
+    def update_masks(self):
+        updated = super().update_masks()
+        invalidate_model(self.model)
+        return updated
+
+    """
+    Caches the counts per criteria until any contact point, keyword assignment or search entry changes
+    """
+    def get_facet_counts(self, filters, term=None, search_backend=None, cache_key=None):
+        count = super().get_facet_counts
+        if cache_key is None:
+            return count(filters, term, search_backend)
+
+        @cached_as(self.model, self.model.keywords.through, SearchEntry, extra=(cache_key, search_backend))
+        def cached_count():
+            return count(filters, term, search_backend)
+        return cached_count()
+
+    """
+    Counts a visit with an atomic UPDATE instead of saving the whole point.
+    Parent rollups are left to `aggregate_children_visibility`.
+    """
+    def record_visit(self, point, is_authenticated, visited_at=None):
+        if visited_at is None:
+            visited_at = timezone.now()
+        counter = 'visits' if is_authenticated else 'anonymous_visits'
+        self.filter(pk=point.pk).update(**{
+            counter: F(counter) + 1,
+            'last_visited_at': visited_at,
+        })
+        setattr(point, counter, getattr(point, counter) + 1)
+        point.last_visited_at = visited_at
+
+    """
+    Set-based equivalent of `ContactPoint.aggregate_children_visibility` for many parents at once
+    """
+    def aggregate_children_visibility(self, parent_ids=None, invalidate=True):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        params = []
+        parent_filter = ''
+        if parent_ids is not None:
+            parent_ids = list(parent_ids)
+            if not parent_ids:
+                return
+            parent_filter = 'AND parent_id IN %s'
+            params.append(tuple(parent_ids))
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS parent SET
+                    last_visited_at = stats.last_visited_at,
+                    visits = stats.visits,
+                    anonymous_visits = stats.anonymous_visits,
+                    popularity = stats.popularity,
+                    views = stats.views
+                FROM (
+                    SELECT parent_id,
+                        MIN(last_visited_at) AS last_visited_at,
+                        ROUND(AVG(visits)) AS visits,
+                        ROUND(AVG(anonymous_visits)) AS anonymous_visits,
+                        ROUND(AVG(popularity)) AS popularity,
+                        ROUND(AVG(views)) AS views
+                    FROM {table}
+                    WHERE parent_id IS NOT NULL {parent_filter}
+                    GROUP BY parent_id
+                ) AS stats
+                WHERE parent.id = stats.parent_id
+            """.format(table=table, parent_filter=parent_filter), params)
+        if invalidate:
+            invalidate_model(self.model)
+            self.invalidate_top()
+
+    """
+    Set-based equivalent of `ContactPoint.precalculate_feedback_stats` for many parents at once
+    """
+    def aggregate_children_feedback(self, parent_ids=None, invalidate=True):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        params = []
+        parent_filter = ''
+        if parent_ids is not None:
+            parent_ids = list(parent_ids)
+            if not parent_ids:
+                return
+            parent_filter = 'AND parent.id IN %s'
+            params.append(tuple(parent_ids))
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS point SET
+                    rating = stats.rating,
+                    effectiveness = stats.effectiveness,
+                    accessibility = stats.accessibility,
+                    feedback_count = stats.feedback_count
+                FROM (
+                    SELECT parent.id,
+                        COALESCE(ROUND(AVG(child.rating)), 0) AS rating,
+                        COALESCE(ROUND(AVG(child.effectiveness)), 0) AS effectiveness,
+                        COALESCE(ROUND(AVG(child.accessibility)), 0) AS accessibility,
+                        COALESCE(SUM(child.feedback_count), 0) AS feedback_count
+                    FROM {table} AS parent
+                    LEFT JOIN {table} AS child ON child.parent_id = parent.id AND child.feedback_count > 0
+                    WHERE parent.parent_id IS NULL {parent_filter}
+                    GROUP BY parent.id
+                ) AS stats
+                WHERE point.id = stats.id
+            """.format(table=table, parent_filter=parent_filter), params)
+        if invalidate:
+            invalidate_model(self.model)
+            self.invalidate_top()
+
+    """
+    Set-based equivalent of `ContactPoint.precalculate_children_summary` for many parents at once
+    """
+    def aggregate_children_summary(self, parent_ids=None, invalidate=True):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        params = []
+        parent_filter = ''
+        if parent_ids is not None:
+            parent_ids = list(parent_ids)
+            if not parent_ids:
+                return
+            parent_filter = 'AND parent.id IN %s'
+            params.append(tuple(parent_ids))
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS point SET
+                    children_count = stats.children_count,
+                    first_child_slug = stats.first_child_slug
+                FROM (
+                    SELECT parent.id,
+                        COUNT(child.id) AS children_count,
+                        (ARRAY_AGG(child.slug ORDER BY child.id))[1] AS first_child_slug
+                    FROM {table} AS parent
+                    LEFT JOIN {table} AS child ON child.parent_id = parent.id
+                    WHERE parent.parent_id IS NULL {parent_filter}
+                    GROUP BY parent.id
+                ) AS stats
+                WHERE point.id = stats.id AND (
+                    point.children_count != stats.children_count
+                    OR point.first_child_slug IS DISTINCT FROM stats.first_child_slug
+                )
+            """.format(table=table, parent_filter=parent_filter), params)
+        if invalidate:
+            invalidate_model(self.model)
+
+    """
+    Recalculates the feedback stats of branches from their published feedback, all of them when `branch_ids` is None.
+    Only branches whose stats drifted are written. Returns the number of updated branches.
+    """
+    def aggregate_branch_feedback(self, branch_ids=None, invalidate=True):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        feedback_table = connection.ops.quote_name(SignalContactPointFeedback._meta.db_table)
+        params = []
+        branch_filter = ''
+        if branch_ids is not None:
+            branch_ids = list(branch_ids)
+            if not branch_ids:
+                return 0
+            branch_filter = 'AND child.id IN %s'
+            params.append(tuple(branch_ids))
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS point SET
+                    rating = stats.rating,
+                    effectiveness = stats.effectiveness,
+                    accessibility = stats.accessibility,
+                    feedback_count = stats.feedback_count
+                FROM (
+                    SELECT child.id,
+                        COALESCE(AVG(feedback.rating), 0) AS rating,
+                        COALESCE(SUM(CASE WHEN feedback.is_effective THEN 1 ELSE -1 END), 0) AS effectiveness,
+                        COALESCE(SUM(CASE WHEN feedback.is_easy THEN 1 ELSE -1 END), 0) AS accessibility,
+                        COUNT(feedback.id) AS feedback_count
+                    FROM {table} AS child
+                    LEFT JOIN {feedback_table} AS feedback ON feedback.contactpoint_id = child.id AND feedback.is_public
+                    WHERE child.parent_id IS NOT NULL {branch_filter}
+                    GROUP BY child.id
+                ) AS stats
+                WHERE point.id = stats.id AND (
+                    ABS(point.rating - stats.rating) > 0.000001
+                    OR point.effectiveness != stats.effectiveness
+                    OR point.accessibility != stats.accessibility
+                    OR point.feedback_count != stats.feedback_count
+                )
+            """.format(table=table, feedback_table=feedback_table, branch_filter=branch_filter), params)
+            updated = cursor.rowcount
+        if invalidate:
+            invalidate_model(self.model)
+        return updated
+
+    """
+    Repairs the feedback stats of branches that drifted from their published feedback
+    and refreshes all parents. Returns the number of repaired branches.
+    """
+    def reconcile_feedback_stats(self):
+        repaired = self.aggregate_branch_feedback()
+        self.aggregate_children_feedback()
+        return repaired
+
 
 class SignalOrganisationManager(models.Manager, VisibilityManagerMixin):
     pass
@@ -84,6 +389,9 @@ class ContactPoint(BaseContactPoint, SignalVisibilityMixin, ContactPointFeedback
     visits = models.PositiveIntegerField(_('visits'), default=0)
     anonymous_visits = models.PositiveIntegerField(_('anonymous visits'), default=0)
     last_visited_at = models.DateTimeField(_('created at'), null=True, blank=True)
+    # denormalized from the branches for list rendering, see `SignalContactPointManager.aggregate_children_summary`
+    children_count = models.PositiveIntegerField(_('Number of branches'), default=0, editable=False)
+    first_child_slug = models.SlugField(_('slug of the first branch'), max_length=255, null=True, editable=False)
 
     def precalculate_feedback_stats(self, feedback_list=None):
         if self.parent is None:
@@ -105,18 +413,36 @@ class ContactPoint(BaseContactPoint, SignalVisibilityMixin, ContactPointFeedback
         else:
             super().precalculate_feedback_stats(feedback_list)
 
+    def precalculate_children_summary(self):
+        if self.parent_id is not None or self.pk is None:
+            self.children_count = 0
+            self.first_child_slug = None
+            return
+        slugs = list(self.children.order_by('pk').values_list('slug', flat=True))
+        self.children_count = len(slugs)
+        self.first_child_slug = slugs[0] if slugs else None
+
+    def _get_prefetched_children(self):
+        return getattr(self, '_prefetched_objects_cache', {}).get('children')
+
     def has_single_child(self):
-        return self.children.count() == 1
+        children = self._get_prefetched_children()
+        if children is not None:
+            return len(children) == 1
+        return self.children_count == 1
 
     @property
     def is_parent_with_many_children(self):
-        return self.parent is None and not self.has_single_child()
+        return self.parent_id is None and not self.has_single_child()
 
     @property
     def slug_or_child_slug(self):
-        if self.parent:
+        if self.parent_id is not None:
             return self.slug
-        return self.children.all()[0].slug
+        children = self._get_prefetched_children()
+        if children is not None:
+            return children[0].slug if children else None
+        return self.first_child_slug
 
     def clone(self):
         keywords = self.keywords.all()
@@ -165,12 +491,11 @@ class ContactPoint(BaseContactPoint, SignalVisibilityMixin, ContactPointFeedback
             setattr(self, stat, value)
 
     def save(self, update_parent=True, *args, **kwargs):
-        if update_parent and self.parent is not None:
-            self.parent.precalculate_feedback_stats()
-            self.parent.aggregate_children_visibility()
-            self.parent.save()
         self.precalculate_feedback_stats()
+        self.precalculate_children_summary()
         super().save(*args, **kwargs)
+        if update_parent and self.parent_id is not None:
+            parent_rollups.mark(self.parent_id)
 
     def specific_title_or_organisation(self):
         title = self.title_or_organisation()
@@ -201,7 +526,31 @@ class ContactPointGrouped(ContactPoint):
 
 
 class SignaliContactPointFeedbackManager(ContactPointFeedbackManager):
-    pass
+
+    """
+    Publishes the earliest feedback of the user on every contact point with one UPDATE.
+    Bypasses the model signals, so the caller has to refresh the stats of the returned points.
+    Returns (contactpoint_id, parent_id) pairs of the points that got newly published feedback.
+    """
+    def publish_first_per_contactpoint(self, user):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        contactpoint_table = connection.ops.quote_name(ContactPoint._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS feedback SET is_public = TRUE
+                FROM (
+                    SELECT DISTINCT ON (contactpoint_id) id, is_public
+                    FROM {table}
+                    WHERE user_id = %s
+                    ORDER BY contactpoint_id, added_at, id
+                ) AS first, {contactpoint_table} AS point
+                WHERE feedback.id = first.id AND NOT first.is_public AND point.id = feedback.contactpoint_id
+                RETURNING point.id, point.parent_id
+            """.format(table=table, contactpoint_table=contactpoint_table), [user.pk])
+            published = cursor.fetchall()
+        if published:
+            invalidate_model(self.model)
+        return published
 
 class SignalContactPointFeedback(ContactPointFeedback):
     objects = SignaliContactPointFeedbackManager()
@@ -209,3 +558,34 @@ class SignalContactPointFeedback(ContactPointFeedback):
     def get_absolute_url(self):
         from django.core.urlresolvers import reverse
         return reverse('contact-point', kwargs={"slug": self.contactpoint.slug})
+
+
+
+class SearchIndexQueue(models.Model):
+    """
+    Contact points waiting to have their search entries refreshed.
+    The same point may be queued several times; entries are coalesced when the queue is drained.
+    """
+    class Meta:
+        verbose_name = _('search index queue entry')
+        verbose_name_plural = _('search index queue')
+
+    contactpoint = models.ForeignKey(ContactPoint, related_name='+')
+    queued_at = models.DateTimeField(_('queued at'), default=timezone.now)
+
+    @classmethod
+    def enqueue(cls, pks):
+        cls.objects.bulk_create([cls(contactpoint_id=pk) for pk in set(pks)])
+
+
+class VisitFlush(models.Model):
+    """
+    Buffered visits already written to the database, so a flush interrupted
+    after its transaction committed is not applied twice when resumed.
+    """
+    class Meta:
+        verbose_name = _('visit flush')
+        verbose_name_plural = _('visit flushes')
+
+    flush_id = models.CharField(_('flush id'), max_length=32, unique=True)
+    flushed_at = models.DateTimeField(_('flushed at'), default=timezone.now)
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from threading import local
+
+# kinds of parent rollups, so a change only recalculates what it can affect
+FEEDBACK = 'feedback'
+VISIBILITY = 'visibility'
+SUMMARY = 'summary'
+ALL = (FEEDBACK, VISIBILITY, SUMMARY)
+
+AGGREGATES = {
+    FEEDBACK: 'aggregate_children_feedback',
+    VISIBILITY: 'aggregate_children_visibility',
+    SUMMARY: 'aggregate_children_summary',
+}
+# top lists whose order depends on the fields of each rollup
+TOP_SORTINGS = {
+    FEEDBACK: ('-rating', '-effectiveness', '-accessibility'),
+    VISIBILITY: ('popularity', '-popularity', '-last_visited_at'),
+    SUMMARY: (),
+}
+
+
+"""
+Recalculates the marked rollups of the parents ({rollup: parent ids})
+and invalidates the caches once, for the affected parents and top lists only
+"""
+def refresh_parents(pending):
+    from .models import ContactPoint
+    manager = ContactPoint.objects
+    parent_ids = set()
+    sortings = set()
+    for rollup in ALL:
+        ids = pending.get(rollup)
+        if not ids:
+            continue
+        getattr(manager, AGGREGATES[rollup])(ids, invalidate=False)
+        parent_ids.update(ids)
+        sortings.update(TOP_SORTINGS[rollup])
+    if parent_ids:
+        manager.invalidate_points(parent_ids)
+    if sortings:
+        manager.invalidate_top(sorted(sortings))
+
+
+class ParentRollupManager(local):
+    """
+    Collects parents whose branches changed so their rollups are recalculated once.
+    Outside of a `deferred()` block parents are refreshed immediately.
+    """
+
+    def __init__(self):
+        self._stack = []
+
+    def is_active(self):
+        return bool(self._stack)
+
+    def mark(self, *parent_ids, rollups=ALL):
+        pending = {rollup: set(parent_ids) for rollup in rollups}
+        if self.is_active():
+            self._merge(pending)
+        else:
+            refresh_parents(pending)
+
+    def reset(self):
+        self._stack = []
+
+    def start(self):
+        self._stack.append({})
+
+    def end(self, discard=False):
+        pending = self._stack.pop()
+        if discard or not pending:
+            return
+        if self.is_active():
+            # nested blocks are flushed with the outermost one
+            self._merge(pending)
+        else:
+            refresh_parents(pending)
+
+    def _merge(self, pending):
+        for rollup, parent_ids in pending.items():
+            self._stack[-1].setdefault(rollup, set()).update(parent_ids)
+
+    @contextmanager
+    def deferred(self):
+        self.start()
+        try:
+            yield
+        except:
+            self.end(discard=True)
+            raise
+        self.end()
+
+
+parent_rollups = ParentRollupManager()
@@ -0,0 +1,79 @@
+"""
+Deferred search indexing of contact points.
+
+When enabled with the `CONTACT_POINT_INDEX_QUEUE` setting, saving a contact point no longer
+updates its watson entry inside the request. Points are queued only when a search-relevant
+field changes and `process_search_queue` refreshes them in batches.
+"""
+from django.db.models.signals import post_init, post_save, m2m_changed
+from watson import search as watson
+from watson.models import SearchEntry
+from cacheops import invalidate_model
+
+from contact.search_watson import rebuild_index
+from signali_taxonomy.models import Category, Keyword
+from .models import ContactPoint, ContactPointGrouped, Organisation, SearchIndexQueue
+
+SEARCH_FIELDS = ('title', 'description', 'slug', 'category_id', 'organisation_id')
+
+
+def get_search_snapshot(instance):
+    # read from __dict__ so deferred fields are not loaded
+    return tuple(instance.__dict__.get(name) for name in SEARCH_FIELDS)
+
+
+def remember_search_fields(instance, **kwargs):
+    instance._search_snapshot = get_search_snapshot(instance)
+
+
+def enqueue_changed_point(instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    snapshot = get_search_snapshot(instance)
+    if created or snapshot != getattr(instance, '_search_snapshot', None):
+        SearchIndexQueue.enqueue([instance.pk])
+    instance._search_snapshot = snapshot
+
+
+def enqueue_keyword_changes(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        SearchIndexQueue.enqueue([instance.pk])
+    elif action == 'pre_clear':
+        SearchIndexQueue.enqueue(instance.contact_points.values_list('pk', flat=True))
+    else:
+        SearchIndexQueue.enqueue(pk_set)
+
+
+def enqueue_related_points(instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    SearchIndexQueue.enqueue(instance.contact_points.values_list('pk', flat=True))
+
+
+def connect():
+    # watson would otherwise index every save in the request
+    post_save.disconnect(watson.default_search_engine._post_save_receiver, sender=ContactPoint)
+    for model in (ContactPoint, ContactPointGrouped):
+        post_init.connect(remember_search_fields, sender=model)
+        post_save.connect(enqueue_changed_point, sender=model)
+    m2m_changed.connect(enqueue_keyword_changes, sender=ContactPoint.keywords.through)
+    for model in (Category, Keyword, Organisation):
+        post_save.connect(enqueue_related_points, sender=model)
+
+
+def process_queue(batch_size=500):
+    processed = 0
+    while True:
+        queued = list(SearchIndexQueue.objects.all().nocache().order_by('pk').values_list('pk', 'contactpoint_id')[:batch_size])
+        if not queued:
+            break
+        pks = set(pk for _, pk in queued)
+        rebuild_index(ContactPoint.objects.filter(pk__in=pks).nocache(), batch_size=batch_size, only_changed=True)
+        SearchIndexQueue.objects.filter(pk__in=[pk for pk, _ in queued]).delete()
+        processed += len(pks)
+    if processed:
+        # entries are bulk created, which doesn't invalidate the results cached on them
+        invalidate_model(SearchEntry)
+    return processed
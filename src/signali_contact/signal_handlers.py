@@ -1,46 +1,112 @@
 from copy import copy
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.models.signals import post_init, post_save, post_delete
 from django.contrib.auth import get_user_model
+from cacheops import invalidate_obj
 
 from contact.signals import post_submit as post_submit
-from .models import ContactPoint, SignalContactPointFeedback
+from .models import ContactPoint, ContactPointGrouped, SignalContactPointFeedback
+from .rollups import parent_rollups, FEEDBACK
 
 UserModel = get_user_model()
 
 
 def publish_user_first_feedback_per_contactpoint(user):
-    for point in ContactPoint.objects.filter(feedback__user=user):
-        first_feedback = point.feedback.filter(user=user).order_by('added_at')[0]
-        if first_feedback.is_public:
-            continue
-        first_feedback.is_public = True
-        first_feedback.save()
+    published = SignalContactPointFeedback.objects.publish_first_per_contactpoint(user)
+    if not published:
+        return
+    branch_ids = set(pk for pk, parent_id in published if parent_id is not None)
+    ContactPoint.objects.aggregate_branch_feedback(branch_ids, invalidate=False)
+    ContactPoint.objects.invalidate_points(branch_ids)
+    # grouped points take their stats from their branches only
+    parent_ids = set(pk if parent_id is None else parent_id for pk, parent_id in published)
+    parent_rollups.mark(*parent_ids, rollups=(FEEDBACK,))
+
+
+def get_activation_state(user):
+    return user.__dict__.get('is_active'), user.__dict__.get('is_email_validated')
+
+
+@receiver(post_init, sender=UserModel)
+def remember_activation_state(instance, **kwargs):
+    instance._activation_state = get_activation_state(instance)
 
 
 @receiver(post_save, sender=UserModel)
-def sync_activation_with_user(instance, **kwargs):
+def sync_activation_with_user(instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # instances that didn't go through `post_init` of this sender have no known previous state
+    old, new = getattr(instance, '_activation_state', None), get_activation_state(instance)
+    instance._activation_state = new
+    # new users have no feedback yet and logins only touch `last_login`
+    if old is None or created or old == new:
+        return
     if not instance.is_active:
         SignalContactPointFeedback.objects.filter(user=instance, is_active=True).update(is_active=False)
     elif instance.is_email_validated:
         publish_user_first_feedback_per_contactpoint(instance)
 
 
+def update_feedback_stats(feedback, old, new):
+    delta = [new_value - old_value for new_value, old_value in zip(new, old)]
+    if not any(delta):
+        return
+    contactpoint = feedback.contactpoint
+    if contactpoint.parent_id is None:
+        # grouped points take their stats from their branches only
+        parent_rollups.mark(contactpoint.pk, rollups=(FEEDBACK,))
+        return
+    ContactPoint.apply_feedback_delta(contactpoint.pk, *delta)
+    invalidate_obj(contactpoint)
+    parent_rollups.mark(contactpoint.parent_id, rollups=(FEEDBACK,))
+
+
+@receiver(post_init, sender=SignalContactPointFeedback)
+def remember_feedback_stats_contribution(instance, **kwargs):
+    instance._stats_contribution = instance.stats_contribution()
+
+
 @receiver(post_save, sender=SignalContactPointFeedback)
-def precalculate_feedback_stats(instance, **kwargs):
-    contactpoint = instance.contactpoint
-    contactpoint.precalculate_feedback_stats()
-    contactpoint.save()
+def precalculate_feedback_stats(instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = (0, 0, 0, 0) if created else instance._stats_contribution
+    new = instance.stats_contribution()
+    instance._stats_contribution = new
+    update_feedback_stats(instance, old, new)
+
+
+@receiver(post_delete, sender=SignalContactPointFeedback)
+def discount_deleted_feedback(instance, **kwargs):
+    update_feedback_stats(instance, instance._stats_contribution, (0, 0, 0, 0))
+
+
+@receiver(post_save, sender=ContactPoint)
+@receiver(post_save, sender=ContactPointGrouped)
+@receiver(post_delete, sender=ContactPoint)
+@receiver(post_delete, sender=ContactPointGrouped)
+def invalidate_top_lists(instance, **kwargs):
+    if instance.parent_id is None:
+        ContactPoint.objects.invalidate_top()
+
+
+@receiver(post_delete, sender=ContactPoint)
+@receiver(post_delete, sender=ContactPointGrouped)
+def refresh_parent_of_deleted_branch(instance, **kwargs):
+    if instance.parent_id is not None:
+        parent_rollups.mark(instance.parent_id)
 
 
 @receiver(post_submit)
 def extract_child(contactpoint, *args, **kwargs):
-    child = copy(contactpoint)
-    child.pk = None
-    child.parent = contactpoint
-    child.save(update_parent=False)
-    contactpoint.operational_area = None
-    contactpoint.url = None
-    contactpoint.email = None
-    contactpoint.save()
+    with parent_rollups.deferred():
+        child = copy(contactpoint)
+        child.pk = None
+        child.parent = contactpoint
+        child.save(update_parent=False)
+        contactpoint.operational_area = None
+        contactpoint.url = None
+        contactpoint.email = None
+        contactpoint.save()
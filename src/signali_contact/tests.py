@@ -0,0 +1,27 @@
+from unittest.mock import patch, PropertyMock
+
+from django.test import TestCase
+
+from .forms import UserCriteriaForm
+
+
+class BlankCriterionTest(TestCase):
+
+    def test_blank_feature_is_scored_and_filtered_against_the_column(self):
+        form = UserCriteriaForm(data={'is_multilingual': ''})
+        self.assertTrue(form.is_valid())
+        with patch.object(UserCriteriaForm, 'is_narrow', new_callable=PropertyMock, return_value=True):
+            score, filters, term = form.to_search_expressions()
+
+        self.assertEqual(form.max_score, 1)
+        self.assertNotEqual(score, 0)
+        self.assertIn("('is_multilingual', '')", str(filters))
+
+    def test_known_feature_value_is_not_matched_against_the_column(self):
+        form = UserCriteriaForm(data={'is_multilingual': 'yes'})
+        self.assertTrue(form.is_valid())
+        score, filters, term = form.to_search_expressions()
+
+        self.assertEqual(form.max_score, 1)
+        self.assertNotEqual(score, 0)
+        self.assertNotIn("'is_multilingual'", str(filters))
@@ -1,5 +1,5 @@
 from django.views.generic.base import View
-from django.utils import timezone
+from django.conf import settings
 
 from restful.decorators import restful_view_templates
 from restful.exception.verbose import VerboseHtmlOnlyRedirectException
@@ -8,6 +8,7 @@ from security.decorators import security_rule
 
 from .models import ContactPoint
 from .signals import post_visit
+from .visits import visit_buffer
 from contact.views import SingleView
 
 
@@ -33,15 +34,12 @@ class VisitsView(SingleView):
     def post(self, request, slug):
         failure = VerboseHtmlOnlyRedirectException().set_redirect('contact-point', slug=slug)
         point = self._get(slug)
-        if request.user.is_authenticated():
-            point.visits += 1
-        else:
-            point.anonymous_visits += 1
-
-        point.last_visited_at = timezone.now()
 
         try:
-            point.save()
+            if settings.CONTACT_POINT_VISIT_BUFFER:
+                visit_buffer.add(point.pk, request.user.is_authenticated())
+            else:
+                ContactPoint.objects.record_visit(point, request.user.is_authenticated())
             post_visit.send(point.__class__, contactpoint=point, user=request.user)
         except:
             raise failure.add_error('db', "Database issues")
@@ -0,0 +1,104 @@
+"""
+Buffers contact point visits in Redis so that a visit costs one Redis round trip.
+`flush_visits` moves the accumulated counters to the database with a single UPDATE
+and recalculates the rollups of the affected parents only.
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from django.db import connection, transaction, IntegrityError
+from django.utils import timezone
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+from cacheops import invalidate_model
+
+from .models import ContactPoint, VisitFlush
+from .rollups import TOP_SORTINGS, VISIBILITY
+
+
+class VisitBuffer(object):
+    key = 'signali_contact:visits'
+    flushing_key = 'signali_contact:visits:flushing'
+    flush_id_field = 'flush_id'
+    # applied flush ids are only needed until their buffer is deleted
+    flush_log_age = timedelta(days=1)
+
+    def __init__(self, cache_alias='default'):
+        self.cache_alias = cache_alias
+
+    @property
+    def redis(self):
+        return get_redis_connection(self.cache_alias)
+
+    def add(self, pk, is_authenticated, visited_at=None):
+        if visited_at is None:
+            visited_at = timezone.now()
+        counter = 'visits' if is_authenticated else 'anonymous_visits'
+        pipe = self.redis.pipeline()
+        pipe.hincrby(self.key, '{}:{}'.format(pk, counter), 1)
+        pipe.hset(self.key, '{}:last_visited_at'.format(pk), visited_at.timestamp())
+        pipe.execute()
+
+    def flush(self):
+        redis = self.redis
+        # a leftover from an interrupted flush is processed before taking new visits
+        if not redis.exists(self.flushing_key):
+            try:
+                redis.rename(self.key, self.flushing_key)
+            except ResponseError:
+                # nothing buffered
+                return 0
+        # kept with the buffer, so a resumed flush is recognised if it was already applied
+        redis.hsetnx(self.flushing_key, self.flush_id_field, uuid4().hex)
+
+        stats = {}
+        flush_id = None
+        for field, value in redis.hgetall(self.flushing_key).items():
+            field = field.decode()
+            if field == self.flush_id_field:
+                flush_id = value.decode()
+                continue
+            pk, stat = field.split(':', 1)
+            point_stats = stats.setdefault(int(pk), {'visits': 0, 'anonymous_visits': 0, 'last_visited_at': None})
+            if stat == 'last_visited_at':
+                point_stats[stat] = datetime.fromtimestamp(float(value), timezone.utc)
+            else:
+                point_stats[stat] = int(value)
+
+        if stats:
+            try:
+                with transaction.atomic():
+                    VisitFlush.objects.create(flush_id=flush_id)
+                    parent_ids = self._update(stats)
+                    ContactPoint.objects.aggregate_children_visibility(parent_ids, invalidate=False)
+            except IntegrityError:
+                # applied before the process that flushed it died
+                stats = {}
+            else:
+                invalidate_model(ContactPoint)
+                ContactPoint.objects.invalidate_top(TOP_SORTINGS[VISIBILITY])
+        redis.delete(self.flushing_key)
+        VisitFlush.objects.filter(flushed_at__lt=timezone.now() - self.flush_log_age).delete()
+        return len(stats)
+
+    def _update(self, stats):
+        table = connection.ops.quote_name(ContactPoint._meta.db_table)
+        values = []
+        params = []
+        for pk, point_stats in stats.items():
+            values.append('(%s::integer, %s::integer, %s::integer, %s::timestamptz)')
+            params += [pk, point_stats['visits'], point_stats['anonymous_visits'], point_stats['last_visited_at']]
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                UPDATE {table} AS point SET
+                    visits = point.visits + buffered.visits,
+                    anonymous_visits = point.anonymous_visits + buffered.anonymous_visits,
+                    last_visited_at = GREATEST(point.last_visited_at, buffered.last_visited_at)
+                FROM (VALUES {values}) AS buffered (id, visits, anonymous_visits, last_visited_at)
+                WHERE point.id = buffered.id
+                RETURNING point.parent_id
+            """.format(table=table, values=', '.join(values)), params)
+            return set(row[0] for row in cursor.fetchall() if row[0] is not None)
+
+
+visit_buffer = VisitBuffer()
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
 from location.models import BaseArea, BaseAreaSize, AreaManager
@@ -19,3 +21,7 @@ class AreaSize(BaseAreaSize, SignalVisibilityMixin):
     pass
 
 
+@receiver(post_save, sender=Area)
+@receiver(post_delete, sender=Area)
+def invalidate_area_closure(**kwargs):
+    Area.objects.invalidate_closure()
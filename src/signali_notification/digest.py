@@ -0,0 +1,117 @@
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from notification import email
+from notification.models import OutgoingEmail
+from signali_contact.models import SignalContactPointFeedback
+from .models import Subscriber
+
+TEMPLATE = 'notification/subscriber_digest'
+
+
+"""
+Queues one email per recipient with the feedback published on their subscribed contact points
+since each subscription was last notified. Feedback on branches counts towards subscriptions to their parent.
+Recipients are streamed in keyset batches: registered users by `user_id`, anonymous subscribers by `email`.
+Returns the number of queued emails.
+"""
+def send_digests(batch_size=500, now=None):
+    if now is None:
+        now = timezone.now()
+
+    by_user = Subscriber.objects.exclude(user=None).filter(user__is_active=True)
+    anonymous = Subscriber.objects.filter(user=None).exclude(Q(email=None) | Q(email=''))
+
+    queued = 0
+    for subscriptions in _recipient_batches(by_user, 'user_id', batch_size):
+        queued += _digest_batch(subscriptions, lambda s: s.user.email, now)
+    for subscriptions in _recipient_batches(anonymous, 'email', batch_size):
+        queued += _digest_batch(subscriptions, lambda s: s.email, now)
+    return queued
+
+
+"""
+Yields all subscriptions of up to `batch_size` distinct recipients at a time
+"""
+def _recipient_batches(queryset, key, batch_size):
+    last = None
+    while True:
+        keys = queryset.order_by(key).values_list(key, flat=True).distinct()
+        if last is not None:
+            keys = keys.filter(**{key + '__gt': last})
+        keys = list(keys[:batch_size])
+        if not keys:
+            return
+        last = keys[-1]
+        yield list(queryset.filter(**{key + '__in': keys}).select_related('user', 'contactpoint__organisation'))
+
+
+def _digest_batch(subscriptions, get_address, now):
+    updates = _new_feedback(subscriptions, now)
+
+    recipients = OrderedDict()
+    seen = defaultdict(set)
+    # a recipient following both a parent and its branch gets each feedback once, under the branch
+    for subscription in sorted(subscriptions, key=lambda s: s.contactpoint.parent_id is None):
+        address = get_address(subscription)
+        if not address:
+            continue
+        feedback = [f for f in updates.get(subscription.pk, ()) if f.pk not in seen[address]]
+        if feedback:
+            seen[address].update(f.pk for f in feedback)
+            recipients.setdefault(address, []).append((subscription.contactpoint, feedback))
+
+    outgoing = [
+        email.prepare(TEMPLATE, address, sender=settings.NOREPLY_FROM_EMAIL, updates=contactpoints)
+        for address, contactpoints in recipients.items()
+    ]
+
+    with transaction.atomic():
+        OutgoingEmail.objects.bulk_create(outgoing)
+        Subscriber.objects.filter(pk__in=[s.pk for s in subscriptions]).update(last_notified_at=now)
+    return len(outgoing)
+
+
+"""
+Maps subscription pk to the feedback it hasn't been notified about, loaded with a single query for the whole batch.
+Each subscription only matches feedback added after its own `last_notified_at`.
+"""
+def _new_feedback(subscriptions, now):
+    contactpoint_ids = set(s.contactpoint_id for s in subscriptions)
+    since = set((s.contactpoint_id, s.last_notified_at) for s in subscriptions)
+    matches = reduce(or_, [
+        (Q(contactpoint_id=contactpoint_id) | Q(contactpoint__parent_id=contactpoint_id)) & Q(added_at__gt=notified_at)
+        for contactpoint_id, notified_at in since
+    ])
+
+    feedback = SignalContactPointFeedback.objects \
+        .filter(is_public=True, added_at__lte=now) \
+        .filter(matches) \
+        .select_related('contactpoint', 'user') \
+        .order_by('added_at')
+
+    # per subscribed contact point, ordered by `added_at`
+    by_contactpoint = defaultdict(list)
+    for f in feedback:
+        by_contactpoint[f.contactpoint_id].append(f)
+        if f.contactpoint.parent_id in contactpoint_ids:
+            by_contactpoint[f.contactpoint.parent_id].append(f)
+
+    dates = {pk: [f.added_at for f in items] for pk, items in by_contactpoint.items()}
+    updates = {}
+    for subscription in subscriptions:
+        items = by_contactpoint.get(subscription.contactpoint_id)
+        if not items:
+            continue
+        start = bisect_right(dates[subscription.contactpoint_id], subscription.last_notified_at)
+        new = [f for f in items[start:] if f.user_id != subscription.user_id]
+        if new:
+            updates[subscription.pk] = new
+    return updates
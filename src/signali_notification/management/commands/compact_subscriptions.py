@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from signali_notification.models import Subscriber
+
+
+class Command(BaseCommand):
+    help = 'Merges duplicate subscriptions of the same recipient for the same contact point'
+
+    def handle(self, *args, **options):
+        deleted = Subscriber.objects.compact()
+        print('Removed {} duplicate subscriptions'.format(deleted))
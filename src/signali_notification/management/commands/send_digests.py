@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from signali_notification.digest import send_digests
+
+
+class Command(BaseCommand):
+    help = 'Queues digest emails with new feedback for contact point subscribers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queued = send_digests(batch_size=options['batch_size'])
+        print('Queued {} digest emails'.format(queued))
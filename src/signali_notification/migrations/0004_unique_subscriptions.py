@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import models, migrations
+
+
+COMPACT_SQL = """
+    UPDATE signali_notification_subscriber AS kept SET last_notified_at = duplicates.last_notified_at
+    FROM (
+        SELECT MIN(id) AS id, MAX(last_notified_at) AS last_notified_at
+        FROM signali_notification_subscriber
+        WHERE {recipient} IS NOT NULL
+        GROUP BY contactpoint_id, {recipient}
+        HAVING COUNT(*) > 1
+    ) AS duplicates
+    WHERE kept.id = duplicates.id;
+
+    DELETE FROM signali_notification_subscriber AS duplicate USING signali_notification_subscriber AS kept
+    WHERE duplicate.contactpoint_id = kept.contactpoint_id
+      AND duplicate.{recipient} = kept.{recipient}
+      AND duplicate.id > kept.id;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('signali_notification', '0003_auto_20150910_1724'),
+    ]
+
+    operations = [
+        migrations.RunSQL(COMPACT_SQL.format(recipient='user_id'), migrations.RunSQL.noop),
+        migrations.RunSQL(COMPACT_SQL.format(recipient='email'), migrations.RunSQL.noop),
+        migrations.AlterUniqueTogether(
+            name='subscriber',
+            unique_together=set([('contactpoint', 'user'), ('contactpoint', 'email')]),
+        ),
+    ]
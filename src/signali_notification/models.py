@@ -1,5 +1,68 @@
-from django.db import models
+from django.db import models, connection, transaction, IntegrityError
 from notification.models import BaseSubscriber
 
+
+class SubscriberManager(models.Manager):
+
+    """
+    Inserts the subscription unless the recipient is already subscribed for the contact point.
+    A concurrent insert of the same subscription is caught by the unique constraints.
+    Returns whether a new subscription was created.
+    """
+    def subscribe(self, contactpoint, user=None, email=None):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        instance = self.model(contactpoint=contactpoint, user=user, email=email)
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO {table} (contactpoint_id, user_id, email, last_notified_at, created_at)
+                    SELECT %s, %s, %s, %s, %s
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM {table}
+                        WHERE contactpoint_id = %s AND (user_id = %s OR email = %s)
+                    )
+                """.format(table=table), [instance.contactpoint_id, instance.user_id, instance.email,
+                                          instance.last_notified_at, instance.created_at,
+                                          instance.contactpoint_id, instance.user_id, instance.email])
+                return cursor.rowcount == 1
+        except IntegrityError:
+            return False
+
+    """
+    Merges duplicate subscriptions of the same recipient for the same contact point.
+    The oldest row is kept with the latest `last_notified_at` of its duplicates.
+    Returns the number of deleted rows.
+    """
+    def compact(self):
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        deleted = 0
+        with connection.cursor() as cursor:
+            for recipient in ('user_id', 'email'):
+                cursor.execute("""
+                    UPDATE {table} AS kept SET last_notified_at = duplicates.last_notified_at
+                    FROM (
+                        SELECT MIN(id) AS id, MAX(last_notified_at) AS last_notified_at
+                        FROM {table}
+                        WHERE {recipient} IS NOT NULL
+                        GROUP BY contactpoint_id, {recipient}
+                        HAVING COUNT(*) > 1
+                    ) AS duplicates
+                    WHERE kept.id = duplicates.id
+                """.format(table=table, recipient=recipient))
+                cursor.execute("""
+                    DELETE FROM {table} AS duplicate USING {table} AS kept
+                    WHERE duplicate.contactpoint_id = kept.contactpoint_id
+                      AND duplicate.{recipient} = kept.{recipient}
+                      AND duplicate.id > kept.id
+                """.format(table=table, recipient=recipient))
+                deleted += cursor.rowcount
+        return deleted
+
+
 class Subscriber(BaseSubscriber):
+    class Meta(BaseSubscriber.Meta):
+        unique_together = (('contactpoint', 'user'), ('contactpoint', 'email'))
+
+    objects = SubscriberManager()
+
     contactpoint = models.ForeignKey('signali_contact.ContactPoint', related_name='subscribers')
@@ -7,7 +7,8 @@ from django.conf import settings
 
 @receiver(post_submit_feedback)
 def new_feedback_to_admin(feedback, *args, **kwargs):
-    email.send(
+    # delivered by `manage.py send_queued_email` once the feedback is committed
+    email.queue(
         'notification/new_feedback',
         settings.ADMIN_EMAIL,
         sender=settings.NOREPLY_FROM_EMAIL,
@@ -20,5 +21,4 @@ def new_feedback_to_admin(feedback, *args, **kwargs):
 def subscribe_after_visit(contactpoint, user, *args, **kwargs):
     if user is None or not user.is_authenticated():
         return
-    s = Subscriber(contactpoint=contactpoint, user=user)
-    s.save()
+    Subscriber.objects.subscribe(contactpoint, user=user)
@@ -7,6 +7,7 @@ from django.utils.translation import ugettext as _
 from django.http import Http404
 
 from .forms import get_anon_subscriber_form
+from .models import Subscriber
 from signali_contact.models import ContactPoint
 
 
@@ -28,7 +29,9 @@ class SubscriberListView(View):
             raise failure.add_error(formname, form.errors)
 
         try:
-            instance = form.save()
+            email = form.cleaned_data['email']
+            Subscriber.objects.subscribe(contactpoint, email=email)
+            instance = Subscriber.objects.get(contactpoint=contactpoint, email=email)
             return HtmlOnlyRedirectSuccessDict({
                 "result": _("Successfully subscribed for contact point"),
                 "subscription": instance